@@ -14,9 +14,9 @@ import sys
 import os
 from threading import Timer
 
-from src.data_loader import load_labels_data, load_mrio_matrices, load_production_history, load_encore_materiality
+from src.data_loader import load_labels_data, MRIOBundle, load_production_history, load_encore_materiality
 from src.callbacks import handle_simulation_results
-from src.config import country_mapping, COUNTRY_CODES_3_LETTER, COLOR_PALETTE, get_valid_region_groups
+from src.config import country_mapping, COUNTRY_CODES_3_LETTER_SERIES, COLOR_PALETTE, get_valid_region_groups
 
 # --- 1. Load Data and Pre-compute --- #
 # Data will be loaded within the callback based on the selected year
@@ -761,9 +761,9 @@ def update_builder_single_chart(region, sector, magnitude, year):
     
     shock = [{'region': region, 'sector': sector, 'magnitude': magnitude}]
     history = load_production_history()
-    _, X_df, _, _, _ = get_cached_matrices(year)
+    mrio, label_to_pos, _ = get_cached_matrices(year)
     
-    return create_builder_historical_plot(shock, history, X_df, country_mapping, COLOR_PALETTE), base_style
+    return create_builder_historical_plot(shock, history, mrio.X, country_mapping, COLOR_PALETTE, label_to_pos=label_to_pos), base_style
 
 @app.callback(
     [Output('builder-combined-chart', 'figure'),
@@ -778,9 +778,9 @@ def update_builder_combined_chart(scenario_data, year):
         return go.Figure(), {**base_style, 'display': 'none'}
     
     history = load_production_history()
-    _, X_df, _, _, _ = get_cached_matrices(year)
+    mrio, label_to_pos, _ = get_cached_matrices(year)
     
-    return create_builder_historical_plot(scenario_data, history, X_df, country_mapping, COLOR_PALETTE), base_style
+    return create_builder_historical_plot(scenario_data, history, mrio.X, country_mapping, COLOR_PALETTE, label_to_pos=label_to_pos), base_style
 
 @app.callback(
     Output("download-portfolio-yaml", "data"),
@@ -814,9 +814,18 @@ def export_scenario(n_clicks, scenario_data):
 
 @lru_cache(maxsize=None)
 def get_cached_matrices(year):
-    """Loads and caches all necessary matrices for a given year."""
+    """
+    Caches the matrices for a given year, together with a label -> position
+    lookup and the raw gross output array so callbacks can avoid repeated
+    MultiIndex .loc lookups. The matrices are loaded lazily on first use.
+    """
     print(f"Cache miss: Loading matrices for year {year} from disk.")
-    return load_mrio_matrices(year, matrices_to_load=['A', 'X', 'Y', 'L', 'G'])
+    mrio = MRIOBundle(year, matrices_to_load=['A', 'X', 'Y', 'L', 'G'])
+    X_df = mrio.X
+    # delta_x vectors from the models are aligned to X_df.index, so positions are taken from it
+    label_to_pos = {label: i for i, label in enumerate(X_df.index)}
+    x_arr = X_df['GrossOutput'].to_numpy()
+    return mrio, label_to_pos, x_arr
 
 @app.callback(
     [Output('impact-waterfall-chart', 'figure'),
@@ -892,7 +901,7 @@ def run_and_update_all_results(n_clicks, year, position_mode, portfolio_data, ho
     return handle_simulation_results(
         n_clicks, year, position_mode, portfolio_data, home_region, home_sector, 
         shock_mode, shock_region, shock_sector, builder_shocks, magnitude, model_method, aggregation_level, cached_data,
-        country_mapping, COUNTRY_CODES_3_LETTER, COLOR_PALETTE
+        country_mapping, COUNTRY_CODES_3_LETTER_SERIES, COLOR_PALETTE
     )
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 import pymrio
 import pandas as pd
 import numpy as np
+import scipy.sparse
 import json
 import os
 from pathlib import Path
@@ -18,6 +19,9 @@ EXIOBASE_DIR = Path(CURRENT_DIR / 'exiobase')
 YEAR_START = int(os.getenv('YEAR_START', '2021'))
 YEAR_END = int(os.getenv('YEAR_END', '2021'))
 
+# Store A as a sparse matrix as well when less than this fraction of entries is non-zero
+A_SPARSE_DENSITY_THRESHOLD = 0.1
+
 # Ensure directories exist
 RAW_DATA_DIR.mkdir(exist_ok=True)
 EXIOBASE_DIR.mkdir(exist_ok=True)
@@ -197,6 +201,8 @@ def ingest_and_save_exiobase(year=2021):
     output_dir.mkdir(exist_ok=True)
     print(f"Saving processed matrices to {output_dir}")
     
+    # Drop the memory-mapped L cache of a previous ingestion, which the app would otherwise keep serving
+    (output_dir / 'EXIOBASE_L.npy').unlink(missing_ok=True)
     A_df.to_parquet(output_dir / 'EXIOBASE_A.parquet')
     L_df.to_parquet(output_dir / 'EXIOBASE_L.parquet')
     G_df.to_parquet(output_dir / 'EXIOBASE_G.parquet')
@@ -204,6 +210,15 @@ def ingest_and_save_exiobase(year=2021):
     E_df.to_parquet(output_dir / 'EXIOBASE_E.parquet')
     X_df.to_parquet(output_dir / 'EXIOBASE_X.parquet')
 
+    # Also store A in sparse form when it is mostly zeros, so the solvers can use a sparse LU
+    A_density = np.count_nonzero(A_df.to_numpy()) / A_df.size
+    print(f"Technical coefficients matrix density: {A_density:.2%}")
+    if A_density < A_SPARSE_DENSITY_THRESHOLD:
+        scipy.sparse.save_npz(output_dir / 'EXIOBASE_A.npz', scipy.sparse.csr_matrix(A_df.to_numpy()))
+    else:
+        # A sparse copy left by an earlier ingestion would be preferred over the new A
+        (output_dir / 'EXIOBASE_A.npz').unlink(missing_ok=True)
+
     # --- 8. Save Labels and Defaults ---
     print("Saving labels and default scenario to JSON.")
     labels_data = {
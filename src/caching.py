@@ -0,0 +1,31 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+def memoize(make_key, maxsize=128):
+    """
+    Decorator that memoizes a function in a bounded LRU cache, keyed by
+    make_key(*args, **kwargs). Cached results are shared between callers
+    and must not be mutated. The wrapper exposes cache_clear().
+    """
+    def decorator(build):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(build)
+        def wrapper(*args, **kwargs):
+            key = make_key(*args, **kwargs)
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            result = build(*args, **kwargs)
+            with lock:
+                cache[key] = result
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
@@ -21,7 +21,8 @@ def handle_simulation_results(n_clicks, year, position_mode, portfolio_data, hom
     if n_clicks == 0:
         return [go.Figure()] * 7 + [{'display': 'none'}]
     
-    A_df, X_df, Y_df, L_df, G_df = cached_data
+    mrio, label_to_pos, x_arr = cached_data
+    A_df, X_df = mrio.A, mrio.X
 
     # --- Expand Shock Regions ---
     _, ALL_COUNTRIES, _, _ = load_labels_data(year)
@@ -54,18 +55,24 @@ def handle_simulation_results(n_clicks, year, position_mode, portfolio_data, hom
         for country in countries_to_shock:
             shock_maps.append({'region': country, 'sector': shock_sector, 'magnitude': magnitude_prop})
 
-    # Run selected model
+    # Run selected model, only loading the inverse matrix it needs
+    L_df, G_df = None, None
     if model_method == 'ghosh':
+        G_df = mrio.G
         _, delta_x = run_physical_risk_ghosh(A_df, X_df, G_df, shock_maps)
     else: # Leontief
-        _, delta_x = run_physical_risk(A_df, X_df, Y_df, L_df, shock_maps)
+        L_df = mrio.L
+        _, delta_x = run_physical_risk(A_df, X_df, mrio.Y, L_df, shock_maps)
 
     if delta_x is None:
         return [go.Figure()] * 3 + ["Model run failed."] + [go.Figure()] * 3 + [{'marginTop': '30px'}]
 
+    # Raw array view of delta_x for positional lookups (aligned with x_arr)
+    delta_x_arr = delta_x.to_numpy()
+
     # --- Generate Plots ---
     production_history = load_production_history()
-    history_fig = create_historical_production_plot(production_history, X_df, shock_maps, country_mapping, COLOR_PALETTE)
+    history_fig = create_historical_production_plot(production_history, X_df, shock_maps, country_mapping, COLOR_PALETTE, label_to_pos=label_to_pos)
     
     # --- Create Title Text ---
     if shock_mode == 'builder':
@@ -82,7 +89,7 @@ def handle_simulation_results(n_clicks, year, position_mode, portfolio_data, hom
 
     # --- Handle Portfolio vs Single Asset ---
     if position_mode == 'portfolio' and portfolio_data:
-        portfolio_breakdown_content = create_portfolio_breakdown_display(portfolio_data, delta_x, X_df, country_mapping, COLOR_PALETTE)
+        portfolio_breakdown_content = create_portfolio_breakdown_display(portfolio_data, delta_x, X_df, country_mapping, COLOR_PALETTE, label_to_pos=label_to_pos)
         total_weight = sum(item['weight'] for item in portfolio_data)
         if not np.isclose(total_weight, 100):
             title = html.Div([
@@ -91,14 +98,10 @@ def handle_simulation_results(n_clicks, year, position_mode, portfolio_data, hom
             ])
             return [go.Figure()] * 3 + [title] + [go.Figure()] * 3 + [{'marginTop': '30px'}]
 
-        total_before_output = 0
-        total_delta_x = 0
-        
-        for item in portfolio_data:
-            item_label = (item['region'], item['sector'])
-            item_weight = item['weight'] / 100.0
-            total_before_output += X_df.loc[item_label, 'GrossOutput'] * item_weight
-            total_delta_x += delta_x.loc[item_label] * item_weight
+        item_pos = np.array([label_to_pos[(item['region'], item['sector'])] for item in portfolio_data])
+        item_weights = np.array([item['weight'] for item in portfolio_data]) / 100.0
+        total_before_output = x_arr[item_pos] @ item_weights
+        total_delta_x = delta_x_arr[item_pos] @ item_weights
 
         percentage_change = (total_delta_x / total_before_output) * 100 if total_before_output > 1e-9 else 0.0
         subtitle_text = f"...causes a {percentage_change:,.2f}% change in your total portfolio value."
@@ -112,14 +115,14 @@ def handle_simulation_results(n_clicks, year, position_mode, portfolio_data, hom
         sankey_fig = create_portfolio_sankey_diagram(A_df, delta_x, shock_maps, portfolio_data, country_mapping, COLOR_PALETTE)
     else: # Single Asset Mode
         portfolio_breakdown_content = html.Div("Portfolio breakdown is not available in Single Asset mode.", style={'textAlign': 'center', 'padding': '40px', 'fontStyle': 'italic'})
-        home_label = (home_region, home_sector)
-        before_shock_output = X_df.loc[home_label, 'GrossOutput']
-        delta_x_home = delta_x.loc[home_label]
+        home_pos = label_to_pos[(home_region, home_sector)]
+        before_shock_output = x_arr[home_pos]
+        delta_x_home = delta_x_arr[home_pos]
         percentage_change = (delta_x_home / before_shock_output) * 100 if before_shock_output > 1e-9 else 0.0
         home_region_name = country_mapping.get(home_region, home_region)
         subtitle_text = f"...causes a {percentage_change:,.2f}% change in output for '{home_sector}' in {home_region_name}."
 
-        home_impact_fig = create_before_after_barchart(X_df, delta_x, home_region, home_sector, country_mapping, COLOR_PALETTE)
+        home_impact_fig = create_before_after_barchart(X_df, delta_x, home_region, home_sector, country_mapping, COLOR_PALETTE, label_to_pos=label_to_pos)
         attribution_dict = attribute_output_change(model_method, delta_x, shock_maps, home_region, home_sector, L_df, G_df, A_df)
         waterfall_fig = create_waterfall_plot(attribution_dict, aggregation_level, country_mapping, COLOR_PALETTE)
         country_fig = create_choropleth_map(attribution_dict, country_mapping, COUNTRY_CODES_3_LETTER, COLOR_PALETTE)
@@ -2,6 +2,11 @@
 
 # This file contains static configuration data for the application.
 
+from functools import lru_cache
+from types import MappingProxyType
+
+import pandas as pd
+
 # Mapping from 2-letter country codes to full names
 country_mapping = {
     "AT": "Austria", "BE": "Belgium", "BG": "Bulgaria", "CY": "Cyprus", "CZ": "Czechia",
@@ -29,6 +34,11 @@ COUNTRY_CODES_3_LETTER = {
     "ID": "IDN", "ZA": "ZAF"
 }
 
+# Read-only view of the ISO code mapping, and a Series version of it for vectorized
+# lookups over whole columns (e.g. index.map(COUNTRY_CODES_3_LETTER_SERIES))
+COUNTRY_CODES_3_LETTER_FROZEN = MappingProxyType(COUNTRY_CODES_3_LETTER)
+COUNTRY_CODES_3_LETTER_SERIES = pd.Series(COUNTRY_CODES_3_LETTER)
+
 # Color Palette for consistent styling across all charts
 # Okabe-Ito colorblind-friendly palette
 COLOR_PALETTE = {
@@ -60,11 +70,19 @@ REGION_GROUPS = {
     'Middle East': ["WM"]
 }
 
+# Immutable copy of the region groups, built once at import
+REGION_GROUPS_FROZEN = {group_name: tuple(member_list) for group_name, member_list in REGION_GROUPS.items()}
+
 # Filter groups to only include valid countries for a given year's dataset
 def get_valid_region_groups(all_countries):
+    # Results are cached per set of countries; callers must treat them as read-only
+    return _get_valid_region_groups(frozenset(all_countries))
+
+@lru_cache(maxsize=8)
+def _get_valid_region_groups(valid_countries):
     valid_groups = {}
-    for group_name, member_list in REGION_GROUPS.items():
-        valid_members = [country for country in member_list if country in all_countries]
+    for group_name, member_list in REGION_GROUPS_FROZEN.items():
+        valid_members = [country for country in member_list if country in valid_countries]
         if valid_members:
             valid_groups[group_name] = valid_members
-    return valid_groups
\ No newline at end of file
+    return valid_groups
@@ -2,15 +2,31 @@ import pandas as pd
 import numpy as np
 import os
 import json
-import dask.dataframe as dd
+import pyarrow.parquet as pq
+import scipy.sparse
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from dotenv import load_dotenv
 from pathlib import Path
 
+# Use orjson for faster JSON parsing when available; json.loads also accepts bytes
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+from src.mrio_solver import factorize_leontief, solve_leontief, calculate_leontief_inverse_array
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Maximum number of matrix files read concurrently by load_mrio_matrices
+MAX_LOADER_THREADS = 4
+
 def get_base_data_path():
     """
     Determines the base path for data files.
@@ -30,6 +46,14 @@ ENCORE_DATA_DIR = BASE_DATA_PATH / 'ENCORE_data'
 
 # --- DUMMY DATA GENERATION (FALLBACK) ---
 
+def _save_matrix(matrix, labels, columns, path):
+    """
+    Saves a NumPy matrix to parquet with the labels as its index.
+    The DataFrame wraps the array without copying it; it is only kept so the
+    file carries the pandas index metadata that the loaders rely on.
+    """
+    pd.DataFrame(matrix, index=labels, columns=columns, copy=False).to_parquet(path)
+
 def _generate_dummy_data(year=None):
     """
     Generates and saves synthetic MRIO data if real data isn't ingested.
@@ -44,6 +68,9 @@ def _generate_dummy_data(year=None):
     # Use Path object methods
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    # The memory-mapped L cache belongs to the data being replaced
+    (output_dir / 'EXIOBASE_L.npy').unlink(missing_ok=True)
+
     labels_path = output_dir / 'labels.json'
 
     countries = ['C1', 'C2']
@@ -66,39 +93,44 @@ def _generate_dummy_data(year=None):
             'defaults': defaults
         }, f)
 
-    # Create and save matrices
+    # Create and save matrices (normalized in place to avoid extra temporaries)
     np.random.seed(42)
-    A_matrix = np.random.rand(size, size) * 0.2
-    A_matrix = A_matrix / (A_matrix.sum(axis=0) * 2)
-    A_df = pd.DataFrame(A_matrix, index=labels, columns=labels)
-    A_df.to_parquet(output_dir / 'EXIOBASE_A.parquet')
+    A_matrix = np.random.rand(size, size)
+    A_matrix *= 0.2
+    A_matrix /= A_matrix.sum(axis=0) * 2
+    _save_matrix(A_matrix, labels, labels, output_dir / 'EXIOBASE_A.parquet')
 
     Y_matrix = np.random.randint(100, 1000, size=(size, 1))
-    Y_df = pd.DataFrame(Y_matrix, index=labels, columns=['FinalDemand'])
-    Y_df.to_parquet(output_dir / 'EXIOBASE_Y.parquet')
+    _save_matrix(Y_matrix, labels, ['FinalDemand'], output_dir / 'EXIOBASE_Y.parquet')
 
     E_matrix = np.random.uniform(0.01, 0.5, size=(size, 1))
-    E_df = pd.DataFrame(E_matrix, index=labels, columns=['LandUse'])
-    E_df.to_parquet(output_dir / 'EXIOBASE_E.parquet')
+    _save_matrix(E_matrix, labels, ['LandUse'], output_dir / 'EXIOBASE_E.parquet')
 
-    I = np.identity(size)
     try:
-        L_matrix = np.linalg.inv(I - A_matrix)
-        x_matrix = L_matrix @ Y_matrix
+        # Factorize (I - A) once and reuse it for both x and L
+        lu_piv = factorize_leontief(A_matrix)
+        x_matrix = solve_leontief(A_matrix, Y_matrix, lu_piv=lu_piv)
+        L_matrix = calculate_leontief_inverse_array(A_matrix, lu_piv=lu_piv)
     except np.linalg.LinAlgError:
-        L_matrix = I # Fallback L
+        L_matrix = np.identity(size) # Fallback L
         x_matrix = Y_matrix * 2
     
-    L_df = pd.DataFrame(L_matrix, index=labels, columns=labels)
-    L_df.to_parquet(output_dir / 'EXIOBASE_L.parquet')
-
-    x_df = pd.DataFrame(x_matrix, index=labels, columns=['GrossOutput'])
-    x_df.to_parquet(output_dir / 'EXIOBASE_X.parquet')
+    _save_matrix(L_matrix, labels, labels, output_dir / 'EXIOBASE_L.parquet')
+    _save_matrix(x_matrix, labels, ['GrossOutput'], output_dir / 'EXIOBASE_X.parquet')
     
     print(f"Generated and saved dummy data in {output_dir}.")
 
 # --- MAIN DATA LOADERS ---
 
+def _read_parquet(path):
+    """
+    Reads a parquet file into a DataFrame through a memory-mapped pyarrow table,
+    releasing the arrow buffers as they are converted.
+    """
+    table = pq.read_table(path, memory_map=True, use_threads=True)
+    return table.to_pandas(self_destruct=True, use_threads=True)
+
+@lru_cache(maxsize=4)
 def load_labels_data(year=2021):
     """
     Loads labels and metadata for a specific year.
@@ -110,17 +142,26 @@ def load_labels_data(year=2021):
         print(f"Data for year {year} not found.")
         _generate_dummy_data(year=year)
 
-    with open(labels_path, 'r') as f:
-        labels_data = json.load(f)
+    labels_data = _json_loads(labels_path.read_bytes())
     
     countries = labels_data['countries']
     sectors = labels_data['sectors']
-    labels = labels_data['labels']
+    labels = _labels_to_index(labels_data['labels'])
     defaults = labels_data.get('defaults')
 
     return labels, countries, sectors, defaults
 
-def load_mrio_matrices(year=2021, matrices_to_load=None, use_dask=False):
+def _labels_to_index(labels):
+    """
+    Converts the labels from labels.json into an integer-coded pandas index:
+    a (region, sector) MultiIndex for ingested EXIOBASE data, whose labels are
+    stored as pairs, or a CategoricalIndex for flat string labels.
+    """
+    if labels and isinstance(labels[0], list):
+        return pd.MultiIndex.from_tuples([tuple(label) for label in labels], names=['region', 'sector'])
+    return pd.CategoricalIndex(labels, categories=labels, ordered=True)
+
+def load_mrio_matrices(year=2021, matrices_to_load=None):
     """
     Loads specified MRIO matrices for a specific year.
     Handles loading the 'A' matrix from multiple parts.
@@ -129,26 +170,169 @@ def load_mrio_matrices(year=2021, matrices_to_load=None, use_dask=False):
         matrices_to_load = ['A', 'Y', 'E', 'X', 'L']
 
     year_data_dir = EXIOBASE_DIR / str(year)
-    reader = dd.read_parquet if use_dask else pd.read_parquet
-    concatenator = dd.concat if use_dask else pd.concat
 
-    matrices = {}
+    def read_matrix(matrix_name):
+        if matrix_name == 'L':
+            return load_leontief_inverse(year)
+        return _read_parquet(year_data_dir / f'EXIOBASE_{matrix_name}.parquet')
+
+    # Parquet decoding releases the GIL, so the files are read concurrently
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(len(matrices_to_load), MAX_LOADER_THREADS))) as executor:
+            matrices = dict(zip(matrices_to_load, executor.map(read_matrix, matrices_to_load)))
+    except FileNotFoundError as e:
+        print(f"Error loading matrices for year {year}. File not found: {e}")
+        print("Please ensure the ingestion script has been run successfully for the selected year.")
+        exit(1)
+            
+    if len(matrices_to_load) == 1:
+        return matrices[matrices_to_load[0]]
+    else:
+        return tuple(matrices.get(name) for name in matrices_to_load)
+
+class MRIOBundle:
+    """
+    Lazily loaded set of MRIO matrices for a specific year.
+    Each matrix is read from disk on first attribute access (e.g. bundle.L) and
+    kept afterwards, so code paths only pay for the matrices they touch.
+    Iterating over the bundle yields all matrices in the requested order.
+    """
+    def __init__(self, year=2021, matrices_to_load=None):
+        if matrices_to_load is None:
+            matrices_to_load = ['A', 'Y', 'E', 'X', 'L']
+        self.year = year
+        self.names = tuple(matrices_to_load)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only reached when normal attribute lookup fails, i.e. for matrix names
+        if name.startswith('_') or name not in self.names:
+            raise AttributeError(f"'{type(self).__name__}' has no matrix '{name}'")
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = load_mrio_matrices(self.year, matrices_to_load=[name])
+            return self._cache[name]
+
+    def __iter__(self):
+        with self._lock:
+            missing = [name for name in self.names if name not in self._cache]
+            if missing:
+                loaded = load_mrio_matrices(self.year, matrices_to_load=missing)
+                if len(missing) == 1:
+                    loaded = (loaded,)
+                self._cache.update(zip(missing, loaded))
+        return iter([self._cache[name] for name in self.names])
+
+def load_mrio_arrays(year=2021, matrices_to_load=None):
+    """
+    Loads specified MRIO matrices for a specific year as plain NumPy arrays,
+    for numerical code that does not need the pandas labels.
+    The row/column labels are available from load_labels_data.
+    """
+    if matrices_to_load is None:
+        matrices_to_load = ['A', 'Y', 'E', 'X', 'L']
+
+    year_data_dir = EXIOBASE_DIR / str(year)
+
+    arrays = {}
     for matrix_name in matrices_to_load:
+        matrix_path = year_data_dir / f'EXIOBASE_{matrix_name}.parquet'
         try:
-            matrix_path = year_data_dir / f'EXIOBASE_{matrix_name}.parquet'
-            matrices[matrix_name] = reader(matrix_path)
-        except FileNotFoundError as e:
-            print(f"Error loading {e.filename}. File not found.")
+            # The matrix is a single float block, so to_numpy() returns a view
+            arrays[matrix_name] = _read_parquet(matrix_path).to_numpy()
+        except FileNotFoundError:
+            print(f"Error loading {matrix_path}. File not found.")
             print("Please ensure the ingestion script has been run successfully for the selected year.")
             exit(1)
-            
+
     if len(matrices_to_load) == 1:
-        return matrices[matrices_to_load[0]]
+        return arrays[matrices_to_load[0]]
     else:
-        return tuple(matrices.get(name) for name in matrices_to_load)
+        return tuple(arrays.get(name) for name in matrices_to_load)
+
+def load_technical_coefficients(year=2021):
+    """
+    Loads the 'A' matrix for a specific year for the solvers: as a sparse CSR
+    matrix if ingestion stored 'EXIOBASE_A.npz', otherwise as a dense array.
+    """
+    sparse_A_path = EXIOBASE_DIR / str(year) / 'EXIOBASE_A.npz'
+    if sparse_A_path.exists():
+        return scipy.sparse.load_npz(sparse_A_path)
+    return load_mrio_arrays(year, matrices_to_load=['A'])
+
+def _save_array_atomic(array, path):
+    """
+    Saves an array in .npy format through a temporary file in the same directory,
+    which is then renamed into place, so an interrupted write never leaves a
+    truncated file at path.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.npy.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+@lru_cache(maxsize=4)
+def load_leontief_inverse(year=2021):
+    """
+    Loads the Leontief inverse for a specific year from a memory-mapped
+    'EXIOBASE_L.npy' cache. The cache is created on first use from
+    'EXIOBASE_L.parquet', or by inverting the 'A' matrix if that is missing,
+    and is rebuilt whenever that source file is newer than the cache.
+    """
+    year_data_dir = EXIOBASE_DIR / str(year)
+    A_path = year_data_dir / 'EXIOBASE_A.parquet'
+    L_path = year_data_dir / 'EXIOBASE_L.parquet'
+    L_cache_path = year_data_dir / 'EXIOBASE_L.npy'
+
+    # L shares the labels of A; reading no columns only decodes the index
+    labels_index = pd.read_parquet(A_path, columns=[]).index
+
+    source_path = L_path if L_path.exists() else A_path
+    if not L_cache_path.exists() or L_cache_path.stat().st_mtime < source_path.stat().st_mtime:
+        if source_path == L_path:
+            L_matrix = load_mrio_arrays(year, matrices_to_load=['L'])
+        else:
+            A = load_technical_coefficients(year)
+            L_matrix = calculate_leontief_inverse_array(A)
+        _save_array_atomic(L_matrix, L_cache_path)
+
+    L_matrix = np.load(L_cache_path, mmap_mode='r')
+    return pd.DataFrame(L_matrix, index=labels_index, columns=labels_index, copy=False)
+
+# Load-once caches for the datasets that do not depend on the year
+_NOT_LOADED = object()
+_production_history = _NOT_LOADED
+_encore_materiality = _NOT_LOADED
+_load_once_lock = threading.Lock()
 
-@lru_cache(maxsize=1)
 def load_production_history():
+    """
+    Loads the aggregated production history data once per process.
+    """
+    global _production_history
+    if _production_history is _NOT_LOADED:
+        with _load_once_lock:
+            if _production_history is _NOT_LOADED:
+                _production_history = _read_production_history()
+    return _production_history
+
+def load_encore_materiality():
+    """
+    Loads the ENCORE materiality data once per process.
+    """
+    global _encore_materiality
+    if _encore_materiality is _NOT_LOADED:
+        with _load_once_lock:
+            if _encore_materiality is _NOT_LOADED:
+                _encore_materiality = _read_encore_materiality()
+    return _encore_materiality
+
+def _read_production_history():
     """
     Loads the aggregated production history data from 'production_history.parquet'.
     """
@@ -160,8 +344,7 @@ def load_production_history():
     
     return pd.read_parquet(history_path)
 
-@lru_cache(maxsize=1)
-def load_encore_materiality():
+def _read_encore_materiality():
     """
     Loads the ENCORE materiality JSON data.
     """
@@ -172,7 +355,4 @@ def load_encore_materiality():
         print("Run `ingest_encore.py` to generate it.")
         return None
     
-    with open(encore_materiality_path, 'r') as f:
-        materiality_data = json.load(f)
-    
-    return materiality_data
\ No newline at end of file
+    return _json_loads(encore_materiality_path.read_bytes())
\ No newline at end of file
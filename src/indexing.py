@@ -0,0 +1,30 @@
+import numpy as np
+
+def label_positions(index, labels):
+    """
+    Integer positions of labels in a pandas index, in the order given. get_indexer
+    alone would map a missing label to -1, i.e. silently to the last sector.
+
+    Raises:
+        KeyError: If a label is not in index.
+    """
+    positions = index.get_indexer(labels)
+    if (positions < 0).any():
+        raise KeyError([label for label, pos in zip(labels, positions) if pos < 0])
+    return positions
+
+def top_k_positions(values, k):
+    """
+    Positions of the k largest entries of values, largest first (ties in positional
+    order, as in Series.nlargest). Uses a partition to find the k-th largest value, so
+    only the k winners are sorted; ties at that value are taken in positional order.
+    """
+    if k <= 0:
+        return np.arange(0)
+    if k < len(values):
+        kth = np.partition(values, -k)[-k]
+        above = np.flatnonzero(values > kth)
+        candidates = np.concatenate([above, np.flatnonzero(values == kth)[:k - len(above)]])
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.lexsort((candidates, -values[candidates]))]
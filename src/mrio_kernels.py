@@ -0,0 +1,119 @@
+import sys
+
+import numpy as np
+from numba import njit, prange
+
+# Numba-compiled kernels for the MRIO solvers and plots.
+# Importing this module imports numba, so callers only load it on first use.
+
+# A frozen (PyInstaller) build has no source tree for numba to cache into and
+# raises at import with cache=True, so there the kernels are compiled per process
+_CACHE = not getattr(sys, 'frozen', False)
+
+@njit(parallel=True, fastmath=True, cache=_CACHE)
+def _matvec(A, v, out):
+    """Computes out = A @ v, with the rows split across threads."""
+    for i in prange(A.shape[0]):
+        acc = 0.0
+        for j in range(A.shape[1]):
+            acc += A[i, j] * v[j]
+        out[i] = acc
+
+@njit(cache=_CACHE)
+def neumann_series(A, y, tol, maxiter):
+    """
+    Sums the Neumann series y + Ay + A^2y + ... for a dense A and a single
+    right-hand side, reusing two term buffers between iterations.
+
+    Returns:
+        tuple: The sum, and whether it converged within maxiter terms.
+    """
+    x = y.copy()
+    term = y.copy()
+    next_term = np.empty_like(y)
+    for _ in range(maxiter):
+        _matvec(A, term, next_term)
+        term, next_term = next_term, term
+        x += term
+        if np.abs(term).max() <= tol * np.abs(x).max():
+            return x, True
+    return x, False
+
+@njit(cache=_CACHE)
+def sankey_links(shock_to_inter, inter_to_target, shock_to_target, shock_nodes, inter_nodes, target_node, threshold):
+    """
+    Collects the Sankey links whose flow exceeds threshold into preallocated buffers:
+    shock -> intermediary, then intermediary -> target, then shock -> target.
+
+    Returns:
+        tuple: The source node, target node and value of each link.
+    """
+    n_shocks, n_inter = shock_to_inter.shape
+    size = n_shocks * n_inter + n_inter + n_shocks
+    sources = np.empty(size, dtype=np.int64)
+    targets = np.empty(size, dtype=np.int64)
+    values = np.empty(size, dtype=np.float64)
+    n = 0
+    for s in range(n_shocks):
+        for i in range(n_inter):
+            if shock_to_inter[s, i] > threshold:
+                sources[n], targets[n], values[n] = shock_nodes[s], inter_nodes[i], shock_to_inter[s, i]
+                n += 1
+    for i in range(n_inter):
+        if inter_to_target[i] > threshold:
+            sources[n], targets[n], values[n] = inter_nodes[i], target_node, inter_to_target[i]
+            n += 1
+    for s in range(n_shocks):
+        if shock_to_target[s] > threshold:
+            sources[n], targets[n], values[n] = shock_nodes[s], target_node, shock_to_target[s]
+            n += 1
+    return sources[:n], targets[:n], values[:n]
+
+@njit(fastmath=True, cache=_CACHE)
+def mixed_model_output(L, A, y, endog_pos, exog_pos, delta_x_m):
+    """
+    New output of the endogenous sectors in the Leontief mixed model,
+    (L_nn - L_nm L_mm^-1 L_mn)(y_n + A_mn' delta_x_m), with the same matrix-free
+    scheme as scenario_modeler._mixed_model_output: v is zero at the shocked
+    positions, so one pass over L gives L_nn v and L_mn v. Only the m x m block
+    L_mm is copied, and everything runs in one compiled call.
+    """
+    size = y.size
+    m = exog_pos.size
+    n = endog_pos.size
+
+    # v = y + A_m' delta_x_m, zeroed at the shocked positions
+    v = y.astype(np.float64)
+    for b in range(m):
+        i = exog_pos[b]
+        d = delta_x_m[b]
+        for j in range(size):
+            v[j] += A[i, j] * d
+    for b in range(m):
+        v[exog_pos[b]] = 0.0
+
+    Lv = np.empty(size)
+    for i in range(size):
+        acc = 0.0
+        for j in range(size):
+            acc += L[i, j] * v[j]
+        Lv[i] = acc
+
+    # z = L_mm^-1 L_mn v
+    L_mm = np.empty((m, m))
+    w = np.empty(m)
+    for b in range(m):
+        w[b] = Lv[exog_pos[b]]
+        for c in range(m):
+            L_mm[b, c] = L[exog_pos[b], exog_pos[c]]
+    z = np.linalg.solve(L_mm, w)
+
+    # x_n = L_nn v - L_nm z
+    x_n = np.empty(n)
+    for a in range(n):
+        i = endog_pos[a]
+        acc = Lv[i]
+        for b in range(m):
+            acc -= L[i, exog_pos[b]] * z[b]
+        x_n[a] = acc
+    return x_n
@@ -1,24 +1,231 @@
-
 import numpy as np
 import pandas as pd
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+
+# Number of identity columns solved at once when building a full inverse from a factorization
+INVERSE_BATCH_SIZE = 1024
+
+# Largest column-sum norm of A for which solve_leontief(method='neumann') tries the series before LU
+NEUMANN_NORM_THRESHOLD = 0.95
+
+def _identity_minus(A, dtype=np.float64):
+    """
+    Builds (I - A) in a single freshly allocated array, without creating
+    an intermediate identity matrix. Sparse inputs give a sparse CSC result.
+    """
+    if scipy.sparse.issparse(A):
+        return (scipy.sparse.identity(A.shape[0], dtype=dtype, format='csc') - A).tocsc()
+    I_minus_A = np.array(A, dtype=dtype, copy=True)
+    np.negative(I_minus_A, out=I_minus_A)
+    I_minus_A.flat[::I_minus_A.shape[0] + 1] += 1
+    return I_minus_A
+
+def factorize_leontief(A, dtype=np.float64):
+    """
+    Computes the LU factorization of (I - A), which can be reused to solve
+    (I - A)x = y for any number of right-hand sides.
+
+    Args:
+        A (pd.DataFrame, np.ndarray or scipy.sparse matrix): Technical coefficients matrix.
+        dtype (np.dtype, optional): Precision the factorization is held in.
+
+    Returns:
+        The (lu, piv) pair as returned by scipy.linalg.lu_factor for a dense A,
+        or a scipy.sparse.linalg.SuperLU object for a sparse A.
+
+    Raises:
+        np.linalg.LinAlgError: If (I - A) is singular.
+    """
+    I_minus_A = _identity_minus(A, dtype=dtype)
+    if scipy.sparse.issparse(I_minus_A):
+        try:
+            return scipy.sparse.linalg.splu(I_minus_A)
+        except RuntimeError as e:
+            raise np.linalg.LinAlgError("Matrix (I-A) is singular.") from e
+    lu, piv = scipy.linalg.lu_factor(I_minus_A, overwrite_a=True, check_finite=False)
+    if np.any(np.diag(lu) == 0):
+        raise np.linalg.LinAlgError("Matrix (I-A) is singular.")
+    return lu, piv
+
+def _load_neumann_kernel():
+    """
+    Imports the compiled Neumann kernel on first use, so numba is only loaded
+    when needed. Returns None if numba is not installed or cannot set up
+    the kernel, in which case the caller falls back to NumPy.
+    """
+    try:
+        from src.mrio_kernels import neumann_series
+    except (ImportError, RuntimeError):
+        # numba raises RuntimeError when it cannot set up the kernel, e.g. without a cache locator
+        return None
+    return neumann_series
+
+def neumann_solve(A, Y, tol=1e-8, maxiter=50):
+    """
+    Solves (I - A)x = Y with the truncated Neumann series x = Y + AY + A^2Y + ...,
+    which converges when the column sums of A are below one. Each term costs a
+    single matrix-vector product, so no factorization is needed.
+
+    Args:
+        A (pd.DataFrame, np.ndarray or scipy.sparse matrix): Technical coefficients matrix.
+        Y (array-like): Final demand vector or matrix (one column per scenario).
+        tol (float, optional): Stop once the latest term is below tol relative to x.
+        maxiter (int, optional): Maximum number of terms to add.
+
+    Returns:
+        np.ndarray: The gross output, or None if the series did not converge.
+    """
+    if not scipy.sparse.issparse(A):
+        A = np.asarray(A)
+        neumann_kernel = _load_neumann_kernel()
+        if neumann_kernel is not None and np.ndim(Y) == 1:
+            x, converged = neumann_kernel(np.ascontiguousarray(A, dtype=np.float64), np.array(Y, dtype=np.float64), tol, maxiter)
+            return x if converged else None
+    x = np.array(Y, dtype=float)
+    term = x.copy()
+    for _ in range(maxiter):
+        term = A @ term
+        x += term
+        if np.abs(term).max() <= tol * np.abs(x).max():
+            return x
+    return None
+
+def solve_leontief(A, Y, lu_piv=None, method='lu'):
+    """
+    Solves (I - A)x = Y for the gross output x without forming the Leontief inverse.
+    By default (I - A) is LU-factorized. With method='neumann', a well-conditioned A
+    is first summed as a Neumann series, which is only accurate to its tolerance,
+    falling back to the LU factorization if the series does not converge.
 
-def calculate_leontief_inverse(A_df):
+    Args:
+        A (pd.DataFrame, np.ndarray or scipy.sparse matrix): Technical coefficients matrix.
+        Y (array-like): Final demand vector or matrix (one column per scenario).
+        lu_piv (optional): A pre-computed factorization from factorize_leontief.
+        method (str, optional): 'lu' for an exact solve, or 'neumann' to try the
+            truncated series first. Ignored when lu_piv is given.
+
+    Returns:
+        np.ndarray: The gross output, with the same shape as Y, in the precision
+            of the factorization.
+
+    Raises:
+        ValueError: If method is not 'lu' or 'neumann'.
+    """
+    if method not in ('lu', 'neumann'):
+        raise ValueError(f"Unknown method '{method}', expected 'lu' or 'neumann'.")
+    if lu_piv is None:
+        # The column-sum norm bounds the convergence rate of the series
+        if method == 'neumann' and abs(A).sum(axis=0).max() < NEUMANN_NORM_THRESHOLD:
+            x = neumann_solve(A, Y)
+            if x is not None:
+                return x
+        lu_piv = factorize_leontief(A)
+    # Y is cast to the precision of the factorization, so a float32 factorization
+    # is also solved in float32
+    if isinstance(lu_piv, scipy.sparse.linalg.SuperLU):
+        # SuperLU exposes no dtype of its own, only through its factors
+        return lu_piv.solve(np.asarray(Y, dtype=lu_piv.U.dtype))
+    return scipy.linalg.lu_solve(lu_piv, np.asarray(Y, dtype=lu_piv[0].dtype), check_finite=False)
+
+def solve_many(A, Ys, lu_piv=None):
+    """
+    Solves (I - A)x = y for several scenarios at once. Stacking the right-hand
+    sides into one matrix lets LAPACK/BLAS work on all of them in a single
+    matrix-matrix call instead of one matrix-vector call per scenario.
+
+    Args:
+        A (pd.DataFrame, np.ndarray or scipy.sparse matrix): Technical coefficients matrix.
+        Ys (list of array-like): Final demand vectors, one per scenario.
+        lu_piv (optional): A pre-computed factorization from factorize_leontief.
+
+    Returns:
+        np.ndarray: The gross output for each scenario, one column per entry in Ys.
+    """
+    return solve_leontief(A, np.column_stack(Ys), lu_piv=lu_piv)
+
+class LeontiefOperator:
+    """
+    Factor-once, solve-many operator for the Leontief system (I - A)x = y.
+    The LU factorization of (I - A) is computed at construction and reused by
+    every solve, followed by one step of iterative refinement with the residual
+    computed in float64. This recovers full accuracy when the factorization is
+    held in float32.
+    """
+    def __init__(self, A, dtype=np.float64):
+        self.A = A if scipy.sparse.issparse(A) else np.asarray(A, dtype=np.float64)
+        self.lu_piv = factorize_leontief(self.A, dtype=dtype)
+
+    def solve(self, y, refine=True):
+        """
+        Solves (I - A)x = y for one or more right-hand sides (columns of y).
+        """
+        y = np.asarray(y, dtype=np.float64)
+        x = np.asarray(solve_leontief(self.A, y, lu_piv=self.lu_piv), dtype=np.float64)
+        if refine:
+            # Residual r = y - (I - A)x, computed without forming (I - A)
+            residual = y - x + self.A @ x
+            x += solve_leontief(self.A, residual, lu_piv=self.lu_piv)
+        return x
+
+def calculate_leontief_inverse_array(A, lu_piv=None, dtype=np.float64):
+    """
+    Calculates the Leontief inverse L = (I - A)^-1 as a plain NumPy array,
+    for numerical callers that do not need the pandas labels.
+
+    Args:
+        A (pd.DataFrame, np.ndarray or scipy.sparse matrix): Technical coefficients matrix.
+        lu_piv (optional): A pre-computed factorization from factorize_leontief.
+        dtype (np.dtype, optional): Working precision. np.float32 halves the memory
+            traffic of the inversion at the cost of precision.
+
+    Returns:
+        np.ndarray: The Leontief inverse matrix.
+
+    Raises:
+        np.linalg.LinAlgError: If (I - A) is singular.
+    """
+    if lu_piv is None and scipy.sparse.issparse(A):
+        lu_piv = factorize_leontief(A, dtype=dtype)
+
+    if lu_piv is None:
+        # (I - A) is built in place and handed to LAPACK to be overwritten
+        return scipy.linalg.inv(_identity_minus(A, dtype=dtype), overwrite_a=True, check_finite=False)
+
+    # Solve against the identity in column batches to bound the size of each right-hand side
+    size = A.shape[0]
+    L = np.empty((size, size), dtype=dtype)
+    for start in range(0, size, INVERSE_BATCH_SIZE):
+        stop = min(start + INVERSE_BATCH_SIZE, size)
+        rhs = np.zeros((size, stop - start), dtype=dtype)
+        rhs[np.arange(start, stop), np.arange(stop - start)] = 1.0
+        L[:, start:stop] = solve_leontief(A, rhs, lu_piv=lu_piv)
+    return L
+
+def calculate_leontief_inverse(A, index=None, lu_piv=None, dtype=np.float64):
     """
     Calculates the Leontief inverse matrix L = (I - A)^-1.
+    Only use this when the full inverse is genuinely required; use
+    solve_leontief for computing L @ Y.
 
     Args:
-        A_df (pd.DataFrame): Technical coefficients matrix.
+        A (pd.DataFrame, np.ndarray or scipy.sparse matrix): Technical coefficients matrix.
+        index (pd.Index, optional): Labels for the result. Defaults to the index
+            of A, so it is required when A is a plain array or sparse matrix.
+        lu_piv (optional): A pre-computed factorization from factorize_leontief.
+        dtype (np.dtype, optional): Working precision. np.float32 halves the memory
+            traffic of the inversion at the cost of precision.
 
     Returns:
         pd.DataFrame: The Leontief inverse matrix, or None if inversion fails.
     """
-    A = A_df.to_numpy()
-    I = np.identity(A.shape[0])
-    
     try:
-        L = np.linalg.inv(I - A)
-        L_df = pd.DataFrame(L, index=A_df.index, columns=A_df.columns)
-        return L_df
+        L = calculate_leontief_inverse_array(A, lu_piv=lu_piv, dtype=dtype)
     except np.linalg.LinAlgError:
         print("Error: Matrix (I-A) is singular and cannot be inverted.")
         return None
+
+    if index is None:
+        return pd.DataFrame(L, index=A.index, columns=A.columns)
+    return pd.DataFrame(L, index=index, columns=index)
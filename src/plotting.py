@@ -1,20 +1,246 @@
+import hashlib
+
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 from dash import dash_table, html
 
+from src.caching import memoize
+from src.indexing import label_positions, top_k_positions
+
+# Maximum number of figures kept by each cached figure builder
+FIGURE_CACHE_SIZE = 128
+
+# Maximum number of summed production histories kept, one per set of shocked sectors
+HISTORY_CACHE_SIZE = 256
+
+# Maximum number of single precision copies of A kept for the Sankey diagrams
+PLOT_MATRIX_CACHE_SIZE = 4
+
+# Longer historical series are downsampled to this many points before plotting
+HISTORY_MAX_POINTS = 500
+
+# Layout pieces shared by the figure builders, which merge their own titles and ranges on top
+TRANSPARENT_BACKGROUND = {'paper_bgcolor': 'rgba(0,0,0,0)', 'plot_bgcolor': 'rgba(0,0,0,0)'}
+AXIS_LINE = {'showline': True, 'linecolor': 'black', 'linewidth': 1}
+BASE_LAYOUT = {**TRANSPARENT_BACKGROUND, 'xaxis': AXIS_LINE, 'yaxis': AXIS_LINE, 'showlegend': False}
+
+# DataTable column specs and cell style, built once at import rather than on every callback
+_FIXED = dash_table.Format.Scheme.fixed
+_PERCENT_CHANGE_FORMAT = dash_table.Format.Format(precision=2, scheme=_FIXED, symbol=dash_table.Format.Symbol.yes, symbol_suffix='%').sign(dash_table.Format.Sign.positive)
+_MONETARY_FORMAT = dash_table.Format.Format(group=",", precision=0, scheme=_FIXED)
+
+PORTFOLIO_COLUMNS = [
+    {"name": "Region", "id": "Region"},
+    {"name": "Sector", "id": "Sector"},
+    {"name": "Weight (%)", "id": "Weight (%)", "type": "numeric", "format": dash_table.Format.Format(precision=1, scheme=_FIXED)},
+    {"name": "Absolute Change", "id": "Absolute Change", "type": "numeric", "format": _MONETARY_FORMAT},
+    {"name": "Relative Change (%)", "id": "Relative Change (%)", "type": "numeric", "format": _PERCENT_CHANGE_FORMAT},
+]
+
+TOP_IMPACTS_COLUMNS = [
+    {"name": "Country", "id": "Country"},
+    {"name": "Sector", "id": "Sector"},
+    {"name": "Output Change (Monetary)", "id": "Output Change (Monetary)", "type": "numeric", "format": _MONETARY_FORMAT},
+    {"name": "Output Change (%)", "id": "Output Change (%)", "type": "numeric", "format": _PERCENT_CHANGE_FORMAT},
+]
+
+TABLE_CELL_STYLE = {
+    'fontFamily': 'Arial, sans-serif',
+    'textAlign': 'left',
+    'padding': '5px',
+    'whiteSpace': 'normal',
+    'height': 'auto',
+}
+
 def truncate_label(label, max_length=60):
     """Shortens a string to a max length and adds '...' if truncated."""
     if len(label) > max_length:
         return label[:max_length - 3] + '...'
     return label
 
-def create_historical_production_plot(production_history, X_df, shock_maps, country_mapping, COLOR_PALETTE):
+def _figure(data=None, layout=None):
+    """
+    Wraps plain trace and layout dicts in a go.Figure. Plotly's property validation
+    is skipped, so the dicts must already use the nested form (e.g. {'title': {'text': ...}}).
+    """
+    return go.Figure({'data': data or [], 'layout': layout or {}}, _validate=False)
+
+def _hline_layout(y, color, text):
+    """Layout shapes and annotations equivalent to fig.add_hline for a dashed threshold line."""
+    return {
+        'shapes': [{'type': 'line', 'xref': 'x domain', 'x0': 0, 'x1': 1, 'yref': 'y', 'y0': y, 'y1': y,
+                    'line': {'color': color, 'dash': 'dash', 'width': 3}}],
+        'annotations': [{'text': text, 'showarrow': False, 'xref': 'x domain', 'x': 1, 'xanchor': 'right',
+                         'yref': 'y', 'y': y, 'yanchor': 'top'}]
+    }
+
+def _memoize(make_key, maxsize=FIGURE_CACHE_SIZE):
+    """
+    Memoizes a builder in a bounded LRU cache keyed by make_key(*args, **kwargs).
+    Repeat views of the same scenario skip the pandas work entirely.
+    """
+    return memoize(make_key, maxsize=maxsize)
+
+def _attribution_key(attribution_dict):
+    """Hashable key for the output of attribute_output_change / attribute_portfolio_change."""
+    return attribution_dict.get('message'), tuple(attribution_dict.get('causes', {}).items())
+
+@_memoize(_attribution_key)
+def _split_causes(attribution_dict):
+    """
+    The attribution causes as a Series indexed by (region, sector). The "region - sector"
+    labels are split once per attribution result and shared by the waterfall and the map.
+    """
+    causes = pd.Series(attribution_dict['causes'])
+    causes.index = causes.index.str.split(" - ", n=1, expand=True).set_names(['region', 'sector'])
+    return causes
+
+def _array_key(values):
+    """Short digest of a numeric Series or array, used to key figures on a model result."""
+    return hashlib.blake2b(np.ascontiguousarray(values).tobytes(), digest_size=16).digest()
+
+@_memoize(lambda A_df: id(A_df), maxsize=PLOT_MATRIX_CACHE_SIZE)
+def _plot_matrix(A_df):
+    """
+    Single precision copy of A, made once per loaded matrix and used only for display.
+    A_df is returned alongside it so the cache keeps it alive and its id stays unique.
+    """
+    return A_df, A_df.to_numpy(dtype=np.float32)
+
+def _sankey_arrays(A_df, delta_x):
+    """
+    Returns A and delta_x as float32 arrays aligned on the columns of A. The diagrams only
+    rank flows and label them to one decimal, so single precision halves the memory
+    traffic at no visible cost. Sankey flows are then computed only for the rows and
+    columns that are needed.
+    """
+    _, A = _plot_matrix(A_df)
+    return A, delta_x.reindex(A_df.columns).to_numpy(dtype=np.float32)
+
+def _region_names(labels, country_mapping):
+    """
+    Country names for the region level of a (region, sector) MultiIndex. Each distinct
+    region is looked up once, and the names are spread to the rows via the integer codes
+    the MultiIndex already stores.
+    """
+    region_level = labels.levels[0]
+    names_by_code = np.array([country_mapping.get(r, r) for r in region_level], dtype=object)
+    return names_by_code[labels.codes[0]]
+
+def _values_at(series, labels, label_to_pos=None):
+    """
+    Values of series at the given labels. label_to_pos, the label -> position map built
+    once per year by get_cached_matrices, turns each lookup into a dict get instead of a
+    MultiIndex search; series must then be aligned with it.
+
+    Raises:
+        KeyError: If a label is not found.
+    """
+    if label_to_pos is not None:
+        positions = [label_to_pos[label] for label in labels]
+    else:
+        positions = label_positions(series.index, labels)
+    return series.to_numpy()[positions]
+
+def _top_intermediary_positions(ranking_scores, other_scores, excluded, max_intermediaries):
+    """
+    Positions of the sectors in the top max_intermediaries * 3 of both score arrays,
+    ordered by ranking_scores and without the excluded positions. Both top sets are
+    selected with ties in positional order; the other one is only tested for membership.
+    """
+    k = max_intermediaries * 3
+    candidates = top_k_positions(ranking_scores, k)
+    other_top = top_k_positions(other_scores, k)
+    keep = np.isin(candidates, other_top, assume_unique=True) & ~np.isin(candidates, excluded)
+    return candidates[keep][:max_intermediaries]
+
+@_memoize(lambda production_history, shock_labels: (id(production_history), tuple(shock_labels)), maxsize=HISTORY_CACHE_SIZE)
+def _historical_production_sum(production_history, shock_labels):
+    """
+    Sums the historical production of the shocked sectors, per year. The history is
+    loaded once per process, so the sum only changes with the set of shocked sectors
+    and is reused when just the shock magnitudes change. production_history is
+    returned alongside it so the cache keeps it alive and its id stays unique.
+    """
+    return production_history, production_history.loc[list(shock_labels)].sum(axis=0).dropna()
+
+def _load_sankey_kernel():
+    """
+    Imports the compiled Sankey link kernel on first use, so numba is only loaded
+    when needed. Returns None if numba is not installed or cannot set up
+    the kernel, in which case the caller falls back to NumPy.
+    """
+    try:
+        from src.mrio_kernels import sankey_links
+    except (ImportError, RuntimeError):
+        # numba raises RuntimeError when it cannot set up the kernel, e.g. without a cache locator
+        return None
+    return sankey_links
+
+def _sankey_links(shock_to_inter, inter_to_target, shock_to_target, shock_nodes, inter_nodes, target_node, threshold=1e-6):
+    """
+    Collects the Sankey links above threshold, in the order shock -> intermediary,
+    intermediary -> target, shock -> target. Runs the compiled kernel when numba
+    is available.
+
+    Returns:
+        tuple: Lists of the source nodes, target nodes and values of the links.
+    """
+    shock_nodes = np.asarray(shock_nodes, dtype=np.int64)
+    inter_nodes = np.asarray(inter_nodes, dtype=np.int64)
+    sankey_kernel = _load_sankey_kernel()
+    if sankey_kernel is not None:
+        sources, targets, values = sankey_kernel(np.ascontiguousarray(shock_to_inter), np.ascontiguousarray(inter_to_target),
+                                                 np.ascontiguousarray(shock_to_target), shock_nodes, inter_nodes, target_node, threshold)
+        return sources.tolist(), targets.tolist(), values.tolist()
+
+    # Masked selection in row-major order gives the links in the same order as the kernel
+    s_idx, i_idx = np.nonzero(shock_to_inter > threshold)
+    inter_links = np.flatnonzero(inter_to_target > threshold)
+    shock_links = np.flatnonzero(shock_to_target > threshold)
+    sources = np.concatenate([shock_nodes[s_idx], inter_nodes[inter_links], shock_nodes[shock_links]])
+    targets = np.concatenate([inter_nodes[i_idx], np.full(len(inter_links) + len(shock_links), target_node, dtype=np.int64)])
+    values = np.concatenate([shock_to_inter[s_idx, i_idx], inter_to_target[inter_links], shock_to_target[shock_links]])
+    return sources.tolist(), targets.tolist(), values.astype(float).tolist()
+
+def _lttb_positions(y, n_out):
+    """
+    Positions of the points kept by Largest-Triangle-Three-Buckets downsampling of y to
+    n_out points. The first and last points are always kept; in each bucket between them,
+    the point forming the largest triangle with the previously kept point and the mean of
+    the next bucket is kept, which preserves peaks and troughs. Points are treated as
+    evenly spaced, as the production histories are.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    kept = np.empty(n_out, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        next_stop = edges[b + 2] if b + 2 < len(edges) else n
+        next_x, next_y = (stop + next_stop - 1) / 2, y[stop:next_stop].mean()
+        a = kept[b]
+        x = np.arange(start, stop)
+        area = np.abs((a - next_x) * (y[start:stop] - y[a]) - (a - x) * (next_y - y[a]))
+        kept[b + 1] = start + np.argmax(area)
+    return kept
+
+def _history_trace(historical_series, COLOR_PALETTE):
+    """Line trace of a historical production series, downsampled if it is very long."""
+    kept = _lttb_positions(historical_series.to_numpy(), HISTORY_MAX_POINTS)
+    return {
+        'type': 'scatter', 'x': historical_series.index.to_numpy()[kept], 'y': historical_series.to_numpy()[kept],
+        'mode': 'lines+markers', 'name': 'Historical Production', 'line': {'color': COLOR_PALETTE['blue']}
+    }
+
+def create_historical_production_plot(production_history, X_df, shock_maps, country_mapping, COLOR_PALETTE, label_to_pos=None):
     """Generates the historical production plot with the post-shock level."""
-    fig = go.Figure()
     if production_history is None or not shock_maps:
-        fig.update_layout(title_text="Historical production data not available or no shock defined.")
-        return fig
+        return _figure(layout={'title': {'text': "Historical production data not available or no shock defined."}})
 
     try:
         shock_labels = [(s['region'], s['sector']) for s in shock_maps]
@@ -22,29 +248,17 @@ def create_historical_production_plot(production_history, X_df, shock_maps, coun
         # Sum historical production across all selected shocks
         # We need to handle cases where a region is 'World' which is not in the history index
         valid_labels = [label for label in shock_labels if label in production_history.index]
-        historical_series = production_history.loc[valid_labels].sum(axis=0).dropna()
+        _, historical_series = _historical_production_sum(production_history, valid_labels)
         
-        # Calculate pre- and post-shock totals
-        base_output_total = 0
-        post_shock_output_total = 0
-
-        for shock in shock_maps:
-            label = (shock['region'], shock['sector'])
-            magnitude_prop = shock['magnitude']
-            base_output = X_df.loc[label, 'GrossOutput']
-            
-            base_output_total += base_output
-            post_shock_output_total += base_output * (1 - magnitude_prop)
+        # Calculate the post-shock total
+        base_output = _values_at(X_df['GrossOutput'], shock_labels, label_to_pos)
+        magnitude_prop = np.array([shock['magnitude'] for shock in shock_maps], dtype=float)
+        post_shock_output_total = base_output @ (1 - magnitude_prop)
 
         if historical_series.empty:
             raise KeyError
 
-        fig.add_trace(go.Scatter(
-            x=historical_series.index, y=historical_series.values, mode='lines+markers',
-            name='Historical Production', line=dict(color=COLOR_PALETTE['blue'])
-        ))
-        fig.add_hline(y=post_shock_output_total, line_width=3, line_dash="dash", line_color=COLOR_PALETTE['red'],
-                      annotation_text="Post-Shock Output", annotation_position="bottom right")
+        trace = _history_trace(historical_series, COLOR_PALETTE)
 
         if len(shock_maps) == 1:
             s = shock_maps[0]
@@ -53,79 +267,75 @@ def create_historical_production_plot(production_history, X_df, shock_maps, coun
         else:
             title = f"Combined Historical Production for {len(shock_maps)} Affected Sectors"
 
-        fig.update_layout(
-            title_text=title,
-            xaxis_title="Year", yaxis_title="Gross Output (Monetary Units)",
-            yaxis_range=[0, max(historical_series.max(), post_shock_output_total) * 1.1],
-            paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-            xaxis=dict(showline=True, linecolor='black', linewidth=1),
-            yaxis=dict(showline=True, linecolor='black', linewidth=1),
-            showlegend=False
-        )
+        layout = {
+            **BASE_LAYOUT,
+            'title': {'text': title},
+            'xaxis': {**AXIS_LINE, 'title': {'text': "Year"}},
+            'yaxis': {**AXIS_LINE, 'title': {'text': "Gross Output (Monetary Units)"},
+                      'range': [0, max(historical_series.max(), post_shock_output_total) * 1.1]},
+            **_hline_layout(post_shock_output_total, COLOR_PALETTE['red'], "Post-Shock Output")
+        }
     except KeyError:
-        fig.update_layout(title_text=f"No historical data for the selected shock scenario.")
+        return _figure(layout={'title': {'text': "No historical data for the selected shock scenario."}})
 
-    return fig
+    return _figure([trace], layout)
 
-def create_before_after_barchart(X_df, delta_x, home_region, home_sector, country_mapping, COLOR_PALETTE, is_portfolio=False, portfolio_before=0, portfolio_after=0):
+def create_before_after_barchart(X_df, delta_x, home_region, home_sector, country_mapping, COLOR_PALETTE, is_portfolio=False, portfolio_before=0, portfolio_after=0, label_to_pos=None):
     """Generates the before/after impact bar chart for the home sector."""
-    fig = go.Figure()
-
     if is_portfolio:
         before_shock_output = portfolio_before
         after_shock_output = portfolio_after
         title_text = "Impact on Total Portfolio Value"
     else:
         home_label = (home_region, home_sector)
-        before_shock_output = X_df.loc[home_label, 'GrossOutput']
-        after_shock_output = before_shock_output + delta_x.loc[home_label]
+        before_shock_output = _values_at(X_df['GrossOutput'], [home_label], label_to_pos)[0]
+        after_shock_output = before_shock_output + _values_at(delta_x, [home_label], label_to_pos)[0]
         title_text = f"Impact on Gross Output for '{home_sector}' in {country_mapping.get(home_region, home_region)}"
 
-    fig.add_trace(go.Bar(
-        x=['Before Shock', 'After Shock'],
-        y=[before_shock_output, after_shock_output],
-        text=[f"{before_shock_output:,.0f}", f"{after_shock_output:,.0f}"],
-        textposition='auto',
-        marker_color=[COLOR_PALETTE['blue'], COLOR_PALETTE['red']]
-    ))
-    fig.update_layout(
-        title_text=title_text,
-        yaxis_title="Gross Output (Monetary Units)",
-        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-        xaxis=dict(showline=True, linecolor='black', linewidth=1),
-        yaxis=dict(showline=True, linecolor='black', linewidth=1),
-        showlegend=False
-    )
-    fig.update_yaxes(rangemode="tozero")
-    return fig
-
+    trace = {
+        'type': 'bar',
+        'x': ['Before Shock', 'After Shock'],
+        'y': [before_shock_output, after_shock_output],
+        'text': [f"{before_shock_output:,.0f}", f"{after_shock_output:,.0f}"],
+        'textposition': 'auto',
+        'marker': {'color': [COLOR_PALETTE['blue'], COLOR_PALETTE['red']]}
+    }
+    layout = {
+        **BASE_LAYOUT,
+        'title': {'text': title_text},
+        'yaxis': {**AXIS_LINE, 'title': {'text': "Gross Output (Monetary Units)"}, 'rangemode': 'tozero'}
+    }
+    return _figure([trace], layout)
+
+@_memoize(lambda attribution_dict, aggregation_level, country_mapping, COLOR_PALETTE:
+                (_attribution_key(attribution_dict), aggregation_level, id(country_mapping), id(COLOR_PALETTE)))
 def create_waterfall_plot(attribution_dict, aggregation_level, country_mapping, COLOR_PALETTE):
     """Generates the waterfall plot showing impact contributors."""
     if not attribution_dict.get('causes'):
-        return go.Figure().update_layout(title=attribution_dict.get('message', 'No impact to display'))
+        return _figure(layout={'title': {'text': attribution_dict.get('message', 'No impact to display')}})
+
+    causes = _split_causes(attribution_dict)
+    regions = pd.Series(causes.index.get_level_values('region'))
+    country_names = pd.Index(regions.map(country_mapping).fillna(regions))
+    sectors = causes.index.get_level_values('sector')
 
-    # Aggregate data based on user selection
+    # Aggregate data based on user selection, keeping groups in order of first appearance
     if aggregation_level == 'country':
-        totals = {}
-        for label, value in attribution_dict['causes'].items():
-            region = label.split(" - ", 1)[0]
-            totals[country_mapping.get(region, region)] = totals.get(country_mapping.get(region, region), 0) + value
+        totals = causes.groupby(country_names, sort=False).sum()
     elif aggregation_level == 'sector':
-        totals = {}
-        for label, value in attribution_dict['causes'].items():
-            sector = label.split(" - ", 1)[1]
-            totals[sector] = totals.get(sector, 0) + value
+        totals = causes.groupby(sectors, sort=False).sum()
     else: # 'none'
-        totals = {f"{country_mapping.get(label.split(' - ')[0], label.split(' - ')[0])} - {label.split(' - ')[1]}": value 
-                  for label, value in attribution_dict['causes'].items()}
+        totals = causes.groupby(country_names + " - " + sectors, sort=False).sum()
 
-    all_items = sorted(totals.items(), key=lambda x: x[1], reverse=True)
-    
-    top_items = all_items[:3]
-    labels = [label for label, _ in top_items]
-    values = [value for _, value in top_items]
-    
-    remaining_sum = sum(value for _, value in all_items[3:])
+    # Split the top 3 from the rest by position rather than dropping labels from the index
+    totals_values = totals.to_numpy()
+    top = top_k_positions(totals_values, 3)
+    labels = totals.index[top].tolist()
+    values = totals_values[top].tolist()
+
+    others = np.ones(len(totals_values), dtype=bool)
+    others[top] = False
+    remaining_sum = totals_values[others].sum()
     if remaining_sum > 1e-6:
         labels.append("Others")
         values.append(remaining_sum)
@@ -137,80 +347,99 @@ def create_waterfall_plot(attribution_dict, aggregation_level, country_mapping,
     
     measures = ['relative'] * (len(values) - 1) + ['total']
     
-    fig = go.Figure(go.Waterfall(
-        name="Top Contributors", orientation="v", measure=measures, x=labels, y=values,
-        text=[f"{val:.1f}%" for val in values], textposition="outside",
-        connector={"line": {"color": "rgb(63, 63, 63)"}}
-    ))
+    trace = {
+        'type': 'waterfall', 'name': "Top Contributors", 'orientation': "v", 'measure': measures, 'x': labels, 'y': values,
+        'text': [f"{val:.1f}%" for val in values], 'textposition': "outside",
+        'connector': {"line": {"color": "rgb(63, 63, 63)"}}
+    }
     
-    top_3_percentage = sum(v for _, v in top_items)
-    fig.update_layout(
-        title={
+    top_3_percentage = totals_values[top].sum()
+    layout = {
+        **BASE_LAYOUT,
+        'title': {
             'text': f"Top Contributors to Output Change<br><sub>(Top 3 account for {top_3_percentage:.1f}% of total impact)</sub>",
             'y':0.95, 'x':0.5, 'xanchor': 'center', 'yanchor': 'top'
         },
-        showlegend=False, yaxis_title="Contribution to Output Change (%)",
-        margin=dict(t=100), yaxis_range=[0, max(110, total_value * 1.1)],
-        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-        xaxis=dict(showline=True, linecolor='black', linewidth=1),
-        yaxis=dict(showline=True, linecolor='black', linewidth=1)
-    )
-    return fig
+        'margin': {'t': 100},
+        'yaxis': {**AXIS_LINE, 'title': {'text': "Contribution to Output Change (%)"}, 'range': [0, max(110, total_value * 1.1)]}
+    }
+    return _figure([trace], layout)
 
+@_memoize(lambda attribution_dict, country_mapping, COUNTRY_CODES_3_LETTER, COLOR_PALETTE:
+                (_attribution_key(attribution_dict), id(country_mapping), id(COUNTRY_CODES_3_LETTER), id(COLOR_PALETTE)))
 def create_choropleth_map(attribution_dict, country_mapping, COUNTRY_CODES_3_LETTER, COLOR_PALETTE):
     """Generates the choropleth map of country contributions."""
     if not attribution_dict.get('causes'):
-        return go.Figure().update_layout(title=attribution_dict.get('message', 'No geographic impact to display'))
-
-    country_totals = {}
-    for label, value in attribution_dict['causes'].items():
-        region = label.split(" - ", 1)[0]
-        country_totals[region] = country_totals.get(region, 0) + value
-    
-    country_attribution = pd.Series(country_totals)
-    country_codes = country_attribution.index.map(COUNTRY_CODES_3_LETTER.get)
-    valid_indices = country_codes.notna()
-    
-    hover_text = [f"{country_mapping.get(country, country)}<br>Contribution: {value:.1f}%"
-                  for country, value in zip(country_attribution.index[valid_indices], country_attribution.values[valid_indices])]
-
-    fig = go.Figure(go.Choropleth(
-        locations=country_codes[valid_indices], z=country_attribution.values[valid_indices],
-        text=hover_text, hoverinfo='text',
-        colorscale=[[0, COLOR_PALETTE['beige']], [0.5, COLOR_PALETTE['amber']], [1, COLOR_PALETTE['red']]],
-        reversescale=False, marker_line_color='darkgray', marker_line_width=0.5,
-        colorbar_title="Contribution (%)"
-    ))
-    fig.update_layout(
-        title={'text': 'Geographic Source of Impact', 'y':0.95, 'x':0.5, 'xanchor': 'center', 'yanchor': 'top'},
-        geo=dict(
-            showframe=False, showcoastlines=True, coastlinecolor="Gray",
-            showland=True, landcolor="LightGray", showocean=True, oceancolor="Azure",
-            projection_type='equirectangular'
-        ),
-        margin=dict(t=40, b=0), paper_bgcolor='rgba(0,0,0,0)'
-    )
-    return fig
+        return _figure(layout={'title': {'text': attribution_dict.get('message', 'No geographic impact to display')}})
+
+    # Sum the contributions per region over the integer region codes of the split labels,
+    # keeping the regions in order of first appearance
+    causes = _split_causes(attribution_dict)
+    region_level, region_codes = causes.index.levels[0], causes.index.codes[0]
+    region_totals = np.bincount(region_codes, weights=causes.to_numpy(dtype=float), minlength=len(region_level))
+    present = pd.unique(region_codes)
+
+    # ISO codes and names are built once per distinct region and gathered by code.
+    # COUNTRY_CODES_3_LETTER may be a dict or a pre-built Series; both are looked up in one pass
+    iso_by_code = np.asarray(region_level.map(COUNTRY_CODES_3_LETTER), dtype=object)
+    names_by_code = np.array([country_mapping.get(r, r) for r in region_level], dtype=str)
+    shown = present[pd.notna(iso_by_code[present])]
+    values = region_totals[shown]
+
+    # Hover text is assembled with NumPy string operations rather than a per-country f-string
+    hover_text = np.char.add(np.char.add(names_by_code[shown], "<br>Contribution: "), np.char.mod("%.1f%%", values)).tolist()
+
+    trace = {
+        'type': 'choropleth',
+        'locations': iso_by_code[shown], 'z': values,
+        'text': hover_text, 'hoverinfo': 'text',
+        'colorscale': [[0, COLOR_PALETTE['beige']], [0.5, COLOR_PALETTE['amber']], [1, COLOR_PALETTE['red']]],
+        'reversescale': False, 'marker': {'line': {'color': 'darkgray', 'width': 0.5}},
+        'colorbar': {'title': {'text': "Contribution (%)"}}
+    }
+    layout = {
+        'title': {'text': 'Geographic Source of Impact', 'y':0.95, 'x':0.5, 'xanchor': 'center', 'yanchor': 'top'},
+        'geo': {
+            'showframe': False, 'showcoastlines': True, 'coastlinecolor': "Gray",
+            'showland': True, 'landcolor': "LightGray", 'showocean': True, 'oceancolor': "Azure",
+            'projection': {'type': 'equirectangular'}
+        },
+        'margin': {'t': 40, 'b': 0}, 'paper_bgcolor': 'rgba(0,0,0,0)'
+    }
+    return _figure([trace], layout)
 
 def create_sankey_diagram(A_df, delta_x, shock_maps, home_region, home_sector, country_mapping, COLOR_PALETTE, max_intermediaries=5):
     """
     Generates a Sankey diagram showing the flow of impact from shocked sectors
     to the home sector through the most significant intermediate sectors.
     """
+    _, fig = _cached_sankey_diagram(A_df, delta_x, shock_maps, home_region, home_sector, country_mapping, COLOR_PALETTE, max_intermediaries)
+    return fig
+
+@_memoize(lambda A_df, delta_x, shock_maps, home_region, home_sector, country_mapping, COLOR_PALETTE, max_intermediaries:
+                (id(A_df), _array_key(delta_x), tuple((s['region'], s['sector']) for s in shock_maps),
+                 home_region, home_sector, id(country_mapping), id(COLOR_PALETTE), max_intermediaries))
+def _cached_sankey_diagram(A_df, delta_x, shock_maps, home_region, home_sector, country_mapping, COLOR_PALETTE, max_intermediaries):
+    """
+    Builds the figure for create_sankey_diagram. Every year has the same shape, so the
+    cache is keyed on the identity of A; A_df is returned alongside the figure so the
+    cache keeps it alive and its id stays unique.
+    """
     shock_labels = [(s['region'], s['sector']) for s in shock_maps]
     home_label = (home_region, home_sector)
-    
-    input_reduction_flows = A_df.multiply(delta_x, axis='columns').abs()
 
-    suppliers_to_home = input_reduction_flows.loc[:, home_label].nlargest(max_intermediaries * 3).index
-    customers_of_shock = input_reduction_flows.loc[shock_labels, :].sum(axis=0).nlargest(max_intermediaries * 3).index
+    # The input reduction flow from i to j is |A[i, j] * delta_x[j]|. Only the rows of the
+    # shocked sectors and the column of the home sector are needed, never the full N x N matrix.
+    A, d = _sankey_arrays(A_df, delta_x)
+    shock_pos = label_positions(A_df.index, shock_labels)
+    home_pos = A_df.index.get_loc(home_label)
+    shock_rows = np.abs(A[shock_pos, :] * d)
+    home_column = np.abs(A[:, home_pos] * d[home_pos])
 
-    top_intermediaries = suppliers_to_home.intersection(customers_of_shock)
-    top_intermediaries = top_intermediaries.drop(shock_labels, errors='ignore').drop(home_label, errors='ignore')
-    top_intermediaries = top_intermediaries[:max_intermediaries]
+    # Intermediaries are major suppliers to home that are also major customers of the shock
+    top_pos = _top_intermediary_positions(home_column, shock_rows.sum(axis=0), np.append(shock_pos, home_pos), max_intermediaries)
+    top_intermediaries = A_df.index[top_pos]
 
-    sources, targets, values = [], [], []
-    
     all_nodes = sorted(list(set(shock_labels + top_intermediaries.tolist() + [home_label])), key=str)
     node_map = {node: i for i, node in enumerate(all_nodes)}
     node_labels = [f"{country_mapping.get(r, r)} - {s}" for r, s in all_nodes]
@@ -225,48 +454,31 @@ def create_sankey_diagram(A_df, delta_x, shock_maps, home_region, home_sector, c
         else:
             node_colors.append(COLOR_PALETTE['amber'])
 
-    # 1. Shock -> Intermediary
-    for s_node in shock_labels:
-        for i_node in top_intermediaries:
-            flow = input_reduction_flows.loc[s_node, i_node]
-            if flow > 1e-6:
-                sources.append(node_map[s_node])
-                targets.append(node_map[i_node])
-                values.append(flow)
-
-    # 2. Intermediary -> Home
-    for i_node in top_intermediaries:
-        flow = input_reduction_flows.loc[i_node, home_label]
-        if flow > 1e-6:
-            sources.append(node_map[i_node])
-            targets.append(node_map[home_label])
-            values.append(flow)
-
-    # 3. Direct Shock -> Home
-    for s_node in shock_labels:
-        flow = input_reduction_flows.loc[s_node, home_label]
-        if flow > 1e-6:
-            sources.append(node_map[s_node])
-            targets.append(node_map[home_label])
-            values.append(flow)
-
-    fig = go.Figure(data=[go.Sankey(
-        node=dict(
+    # Links: Shock -> Intermediary, Intermediary -> Home and direct Shock -> Home
+    sources, targets, values = _sankey_links(
+        shock_rows[:, top_pos], home_column[top_pos], shock_rows[:, home_pos],
+        [node_map[s_node] for s_node in shock_labels], [node_map[i_node] for i_node in top_intermediaries],
+        node_map[home_label]
+    )
+
+    trace = {
+        'type': 'sankey',
+        'node': dict(
             pad=15, thickness=20, line=dict(color="black", width=0.5), 
             label=node_labels,
             color=node_colors
         ),
-        link=dict(
+        'link': dict(
             source=sources, target=targets, value=values, color="rgba(153, 153, 153, 0.4)" # Corresponds to #999999 (grey) with alpha
         )
-    )])
+    }
     
     title = "Supply Chain Impact Flow"
+    layout = {**TRANSPARENT_BACKGROUND, 'title': {'text': title}}
     if not sources:
-        fig.add_annotation(text="No significant intermediary links found.", showarrow=False)
+        layout['annotations'] = [{'text': "No significant intermediary links found.", 'showarrow': False}]
 
-    fig.update_layout(title_text=title, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-    return fig
+    return A_df, _figure([trace], layout)
 
 def create_portfolio_sankey_diagram(A_df, delta_x, shock_maps, portfolio_data, country_mapping, COLOR_PALETTE, max_intermediaries=5):
     """
@@ -277,27 +489,26 @@ def create_portfolio_sankey_diagram(A_df, delta_x, shock_maps, portfolio_data, c
     portfolio_labels = [(p['region'], p['sector']) for p in portfolio_data]
     portfolio_weights = {(p['region'], p['sector']): p['weight'] / 100.0 for p in portfolio_data}
 
-    # Calculate the monetary value of reduced input flows between all sectors
-    input_reduction_flows = A_df.multiply(delta_x, axis='columns').abs()
+    # Monetary value of reduced input flows, |A[i, j] * delta_x[j]|, restricted to the
+    # rows of the shocked sectors and the columns of the portfolio assets
+    A, d = _sankey_arrays(A_df, delta_x)
+    shock_pos = label_positions(A_df.index, shock_labels)
+    asset_pos = label_positions(A_df.index, list(portfolio_weights))
+    asset_weights = np.fromiter(portfolio_weights.values(), dtype=np.float32, count=len(portfolio_weights))
+    shock_rows = np.abs(A[shock_pos, :] * d)
+
+    # Weighted sum of flows to portfolio assets. Since |A[i, j] * d[j]| = |A[i, j]| * |d[j]|,
+    # |delta_x| and the weights fold into one vector and the sum is a single matrix-vector product.
+    asset_flow_weights = np.abs(d[asset_pos]) * asset_weights
+    suppliers_to_portfolio = np.abs(A[:, asset_pos]) @ asset_flow_weights
 
     # Find top intermediaries: sectors that are both major customers of the shock
     # and major suppliers to the portfolio.
-    customers_of_shock = input_reduction_flows.loc[shock_labels, :].sum(axis=0).nlargest(max_intermediaries * 3).index
-    
-    # Weighted sum of flows to portfolio assets
-    suppliers_to_portfolio = pd.Series(0.0, index=A_df.index)
-    for p_label, weight in portfolio_weights.items():
-        suppliers_to_portfolio += input_reduction_flows.loc[:, p_label] * weight
-    
-    top_suppliers_to_portfolio = suppliers_to_portfolio.nlargest(max_intermediaries * 3).index
-
-    top_intermediaries = customers_of_shock.intersection(top_suppliers_to_portfolio)
-    top_intermediaries = top_intermediaries.drop(shock_labels, errors='ignore').drop(portfolio_labels, errors='ignore')
-    top_intermediaries = top_intermediaries[:max_intermediaries]
+    excluded = np.concatenate([shock_pos, label_positions(A_df.index, portfolio_labels)])
+    top_pos = _top_intermediary_positions(shock_rows.sum(axis=0), suppliers_to_portfolio, excluded, max_intermediaries)
+    top_intermediaries = A_df.index[top_pos]
 
     # --- Build Sankey Data ---
-    sources, targets, values = [], [], []
-    
     # Define nodes: Shocks, Intermediaries, and a single "Total Portfolio" node
     portfolio_node_label = "Total Portfolio"
     all_nodes_tuples = sorted(list(set(shock_labels + top_intermediaries.tolist())), key=str)
@@ -311,91 +522,65 @@ def create_portfolio_sankey_diagram(A_df, delta_x, shock_maps, portfolio_data, c
                   [COLOR_PALETTE['amber']] * len(top_intermediaries) + \
                   [COLOR_PALETTE['blue']]
 
-    # 1. Shock -> Intermediary flows
-    for s_node in shock_labels:
-        for i_node in top_intermediaries:
-            flow = input_reduction_flows.loc[s_node, i_node]
-            if flow > 1e-6:
-                sources.append(node_map[s_node])
-                targets.append(node_map[i_node])
-                values.append(flow)
-
-    # 2. Intermediary -> Portfolio flows (weighted sum)
-    for i_node in top_intermediaries:
-        total_flow_to_portfolio = suppliers_to_portfolio.get(i_node, 0)
-        if total_flow_to_portfolio > 1e-6:
-            sources.append(node_map[i_node])
-            targets.append(portfolio_node_index)
-            values.append(total_flow_to_portfolio)
-
-    # 3. Direct Shock -> Portfolio flows (weighted sum)
-    for s_node in shock_labels:
-        direct_flow_to_portfolio = sum(input_reduction_flows.loc[s_node, p_label] * weight for p_label, weight in portfolio_weights.items())
-        if direct_flow_to_portfolio > 1e-6:
-            sources.append(node_map[s_node])
-            targets.append(portfolio_node_index)
-            values.append(direct_flow_to_portfolio)
-
-    fig = go.Figure(data=[go.Sankey(
-        node=dict(pad=15, thickness=20, line=dict(color="black", width=0.5), label=node_labels, color=node_colors),
-        link=dict(source=sources, target=targets, value=values, color="rgba(153, 153, 153, 0.4)")
-    )])
+    # Links: Shock -> Intermediary, Intermediary -> Portfolio and direct Shock -> Portfolio,
+    # the last two as weighted sums over the portfolio assets
+    direct_flows_to_portfolio = np.abs(A[np.ix_(shock_pos, asset_pos)]) @ asset_flow_weights
+    sources, targets, values = _sankey_links(
+        shock_rows[:, top_pos], suppliers_to_portfolio[top_pos], direct_flows_to_portfolio,
+        [node_map[s_node] for s_node in shock_labels], [node_map[i_node] for i_node in top_intermediaries],
+        portfolio_node_index
+    )
+
+    trace = {
+        'type': 'sankey',
+        'node': dict(pad=15, thickness=20, line=dict(color="black", width=0.5), label=node_labels, color=node_colors),
+        'link': dict(source=sources, target=targets, value=values, color="rgba(153, 153, 153, 0.4)")
+    }
     
     title = "Aggregated Supply Chain Impact Flow to Portfolio"
+    layout = {**TRANSPARENT_BACKGROUND, 'title': {'text': title}}
     if not sources:
-        fig.add_annotation(text="No significant intermediary links found for the portfolio.", showarrow=False)
+        layout['annotations'] = [{'text': "No significant intermediary links found for the portfolio.", 'showarrow': False}]
 
-    fig.update_layout(title_text=title, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-    return fig
+    return _figure([trace], layout)
 
-def create_portfolio_breakdown_display(portfolio_data, delta_x, X_df, country_mapping, COLOR_PALETTE):
+def create_portfolio_breakdown_display(portfolio_data, delta_x, X_df, country_mapping, COLOR_PALETTE, label_to_pos=None):
     """
     Creates a table and summary for the portfolio breakdown tab.
     """
-    records = []
-    total_before = 0
-    total_after = 0
-
-    for item in portfolio_data:
-        label = (item['region'], item['sector'])
-        weight = item['weight']
-        
-        before_val = X_df.loc[label, 'GrossOutput']
-        delta_val = delta_x.loc[label]
-        after_val = before_val + delta_val
-        
-        relative_change = (delta_val / before_val) * 100 if before_val > 1e-9 else 0
-
-        records.append({
-            'Region': country_mapping.get(item['region'], item['region']),
-            'Sector': item['sector'],
-            'Weight (%)': weight,
-            'Absolute Change': delta_val,
-            'Relative Change (%)': relative_change
-        })
-        
-        # For weighted total calculation
-        weight_prop = weight / 100.0
-        total_before += before_val * weight_prop
-        total_after += after_val * weight_prop
+    regions = [item['region'] for item in portfolio_data]
+    sectors = [item['sector'] for item in portfolio_data]
+    weights = [item['weight'] for item in portfolio_data]
+    labels = list(zip(regions, sectors))
+
+    # One vectorized lookup for all assets instead of a .loc call per asset
+    before = _values_at(X_df['GrossOutput'], labels, label_to_pos)
+    delta = _values_at(delta_x, labels, label_to_pos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative_change = np.where(before > 1e-9, delta / before * 100, 0)
+
+    # For weighted total calculation
+    weight_prop = np.asarray(weights, dtype=float) / 100.0
+    total_before = before @ weight_prop
+    total_after = total_before + delta @ weight_prop
 
     # Create DataFrame for the table
-    df = pd.DataFrame(records)
+    df = pd.DataFrame({
+        'Region': [country_mapping.get(region, region) for region in regions],
+        'Sector': sectors,
+        'Weight (%)': weights,
+        'Absolute Change': delta,
+        'Relative Change (%)': relative_change
+    })
 
     # Create the DataTable
     table = dash_table.DataTable(
-        columns=[
-            {"name": "Region", "id": "Region"},
-            {"name": "Sector", "id": "Sector"},
-            {"name": "Weight (%)", "id": "Weight (%)", "type": "numeric", "format": dash_table.Format.Format(precision=1, scheme=dash_table.Format.Scheme.fixed)},
-            {"name": "Absolute Change", "id": "Absolute Change", "type": "numeric", "format": dash_table.Format.Format(group=",", precision=0, scheme=dash_table.Format.Scheme.fixed)},
-            {"name": "Relative Change (%)", "id": "Relative Change (%)", "type": "numeric", "format": dash_table.Format.Format(precision=2, scheme=dash_table.Format.Scheme.fixed, symbol=dash_table.Format.Symbol.yes, symbol_suffix='%').sign(dash_table.Format.Sign.positive)},
-        ],
+        columns=PORTFOLIO_COLUMNS,
         data=df.to_dict('records'),
         sort_action="native",
         style_table={'overflowX': 'auto'},
         style_header={'backgroundColor': COLOR_PALETTE['grey'], 'color': 'white', 'fontWeight': 'bold'},
-        style_cell={'textAlign': 'left', 'padding': '5px', 'whiteSpace': 'normal', 'height': 'auto', 'fontFamily': 'Arial, sans-serif', 'textAlign': 'left', 'padding': '5px', 'whiteSpace': 'normal', 'height': 'auto'},
+        style_cell=TABLE_CELL_STYLE,
         style_data_conditional=[
             {'if': {'column_id': 'Absolute Change', 'filter_query': '{Absolute Change} < 0'}, 'color': COLOR_PALETTE['red']},
             {'if': {'column_id': 'Relative Change (%)', 'filter_query': '{Relative Change (%)} < 0'}, 'color': COLOR_PALETTE['red']}
@@ -434,32 +619,34 @@ def create_top_impacts_table(delta_x, X_df, shock_maps, country_mapping, COLOR_P
     """
     shock_labels = [(s['region'], s['sector']) for s in shock_maps]
 
-    percentage_change = (delta_x / X_df['GrossOutput']).replace([np.inf, -np.inf], 0).fillna(0) * 100
-    
-    impact_df = pd.DataFrame({
-        'Country': delta_x.index.get_level_values('region').map(country_mapping),
-        'Sector': delta_x.index.get_level_values('sector'),
-        'Output Change (Monetary)': delta_x,
-        'Output Change (%)': percentage_change
+    # Drop the shocked sectors by position before computing anything
+    shock_pos = delta_x.index.get_indexer(shock_labels)
+    keep = np.ones(len(delta_x), dtype=bool)
+    keep[shock_pos[shock_pos >= 0]] = False
+    positions = np.flatnonzero(keep)
+
+    delta = delta_x.to_numpy()[positions]
+    gross_output = X_df['GrossOutput'].reindex(delta_x.index).to_numpy()[positions]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage_change = delta / gross_output * 100
+    percentage_change[~np.isfinite(percentage_change)] = 0
+
+    # Select the top 100 by absolute percentage change; only those 100 are sorted
+    top = top_k_positions(np.abs(percentage_change), 100)
+    top_labels = delta_x.index[positions[top]]
+
+    top_100_impacted = pd.DataFrame({
+        'Country': _region_names(top_labels, country_mapping),
+        'Sector': top_labels.get_level_values('sector'),
+        'Output Change (Monetary)': delta[top],
+        'Output Change (%)': percentage_change[top]
     })
-    
-    impact_df.drop(index=shock_labels, inplace=True, errors='ignore')
-
-    # Sort by absolute percentage change to get the top 100
-    top_100_impacted = impact_df.reindex(impact_df['Output Change (%)'].abs().sort_values(ascending=False).index).head(100)
-
-    columns = [
-        {"name": "Country", "id": "Country"},
-        {"name": "Sector", "id": "Sector"},
-        {"name": "Output Change (Monetary)", "id": "Output Change (Monetary)", "type": "numeric", "format": dash_table.Format.Format(group=",", precision=0, scheme=dash_table.Format.Scheme.fixed)},
-        {"name": "Output Change (%)", "id": "Output Change (%)", "type": "numeric", "format": dash_table.Format.Format(precision=2, scheme=dash_table.Format.Scheme.fixed, symbol=dash_table.Format.Symbol.yes, symbol_suffix='%').sign(dash_table.Format.Sign.positive)},
-    ]
 
     data = top_100_impacted.to_dict('records')
 
     return dash_table.DataTable(
         id='global-impacts-datatable',
-        columns=columns,
+        columns=TOP_IMPACTS_COLUMNS,
         data=data,
         sort_action="native",
         sort_mode="multi",
@@ -470,13 +657,7 @@ def create_top_impacts_table(delta_x, X_df, shock_maps, country_mapping, COLOR_P
             'color': 'white',
             'fontWeight': 'bold'
         },
-        style_cell={
-            'fontFamily': 'Arial, sans-serif',
-            'textAlign': 'left',
-            'padding': '5px',
-            'whiteSpace': 'normal',
-            'height': 'auto',
-        },
+        style_cell=TABLE_CELL_STYLE,
         style_data_conditional=[
             {
                 'if': {'column_id': 'Output Change (%)', 'filter_query': '{Output Change (%)} < 0'},
@@ -489,42 +670,29 @@ def create_top_impacts_table(delta_x, X_df, shock_maps, country_mapping, COLOR_P
         ]
     )
 
-def create_builder_historical_plot(shocks, production_history, X_df, country_mapping, COLOR_PALETTE):
+def create_builder_historical_plot(shocks, production_history, X_df, country_mapping, COLOR_PALETTE, label_to_pos=None):
     """
     Generates a historical production plot for the scenario builder.
     Can plot a single shock or the combined total of multiple shocks.
     """
-    fig = go.Figure()
     if not shocks or production_history is None or X_df is None:
-        return fig.update_layout(title_text="Select a shock to see historical context.")
+        return _figure(layout={'title': {'text': "Select a shock to see historical context."}})
 
     try:
         shock_labels = [(s['region'], s['sector']) for s in shocks]
         
         # Sum historical production across all selected shocks
-        historical_series = production_history.loc[shock_labels].sum(axis=0).dropna()
+        _, historical_series = _historical_production_sum(production_history, shock_labels)
         
-        # Calculate pre- and post-shock totals
-        base_output_total = 0
-        post_shock_output_total = 0
-
-        for shock in shocks:
-            label = (shock['region'], shock['sector'])
-            magnitude_prop = shock['magnitude'] / 100.0
-            base_output = X_df.loc[label, 'GrossOutput']
-            
-            base_output_total += base_output
-            post_shock_output_total += base_output * (1 - magnitude_prop)
+        # Calculate the post-shock total
+        base_output = _values_at(X_df['GrossOutput'], shock_labels, label_to_pos)
+        magnitude_prop = np.array([shock['magnitude'] for shock in shocks], dtype=float) / 100.0
+        post_shock_output_total = base_output @ (1 - magnitude_prop)
 
         if historical_series.empty:
             raise KeyError
 
-        fig.add_trace(go.Scatter(
-            x=historical_series.index, y=historical_series.values, mode='lines+markers',
-            name='Historical Production', line=dict(color=COLOR_PALETTE['blue'])
-        ))
-        fig.add_hline(y=post_shock_output_total, line_width=3, line_dash="dash", line_color=COLOR_PALETTE['red'],
-                      annotation_text="Post-Shock Output", annotation_position="bottom right")
+        trace = _history_trace(historical_series, COLOR_PALETTE)
 
         if len(shocks) == 1:
             s = shocks[0]
@@ -533,17 +701,16 @@ def create_builder_historical_plot(shocks, production_history, X_df, country_map
         else:
             title = f"Combined Historical Production for {len(shocks)} Shocks"
 
-        fig.update_layout(
-            title_text=title,
-            xaxis_title="Year", yaxis_title="Gross Output",
-            yaxis_range=[0, max(historical_series.max(), post_shock_output_total) * 1.1],
-            paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-            xaxis=dict(showline=True, linecolor='black', linewidth=1),
-            yaxis=dict(showline=True, linecolor='black', linewidth=1),
-            showlegend=False,
-            margin=dict(t=40, b=20, l=20, r=20)
-        )
+        layout = {
+            **BASE_LAYOUT,
+            'title': {'text': title},
+            'xaxis': {**AXIS_LINE, 'title': {'text': "Year"}},
+            'yaxis': {**AXIS_LINE, 'title': {'text': "Gross Output"},
+                      'range': [0, max(historical_series.max(), post_shock_output_total) * 1.1]},
+            'margin': {'t': 40, 'b': 20, 'l': 20, 'r': 20},
+            **_hline_layout(post_shock_output_total, COLOR_PALETTE['red'], "Post-Shock Output")
+        }
     except (KeyError, AttributeError):
-        fig.update_layout(title_text="No historical data available for the selection.")
+        return _figure(layout={'title': {'text': "No historical data available for the selection."}})
 
-    return fig
\ No newline at end of file
+    return _figure([trace], layout)
\ No newline at end of file
@@ -1,126 +1,260 @@
 import numpy as np
 import pandas as pd
-import dask.dataframe as dd
-import dask.array as da
+import scipy.linalg
+from src.caching import memoize
+from src.indexing import label_positions, top_k_positions
 from src.data_loader import load_mrio_matrices
 
-def run_physical_risk(A_df, X_df, Y_df, L_df, shock_maps):
+# Δy = (I - A)Δx only reads the columns of A at nonzero Δx when fewer than this
+# fraction of the sectors changed output
+SPARSE_DELTA_FRACTION = 0.1
+
+# Maximum number of reduced precision copies of A, L and G kept for the scenario models
+MATRIX_CACHE_SIZE = 4
+
+# Maximum number of shocked-sector partitions kept, one per set of shocked sectors
+PARTITION_CACHE_SIZE = 64
+
+# Largest number of sectors for which the mixed model runs in the compiled kernel. Below
+# it NumPy's per-call overhead dominates; above it the BLAS products are faster.
+MIXED_KERNEL_MAX_SIZE = 1000
+
+@memoize(lambda matrix_df, dtype: (id(matrix_df), np.dtype(dtype)), maxsize=MATRIX_CACHE_SIZE)
+def _converted_matrix(matrix_df, dtype):
     """
-    Models a physical risk scenario using a mixed input-output model.
-    This implementation uses the partitioning method with the pre-calculated
-    full Leontief inverse to ensure both accuracy and high performance.
+    Copy of matrix_df's values in another precision, made once per loaded matrix.
+    matrix_df is returned alongside it so the cache keeps it alive and its id stays unique.
     """
-    # Matrices (A, X, Y, L) are passed as arguments to improve performance.
-    
-    # Identify exogenous (shocked) and endogenous (non-shocked) sectors
-    all_labels = A_df.index
-    exogenous_labels = pd.MultiIndex.from_tuples([
-        (shock['region'], shock['sector']) for shock in shock_maps
-    ])
-    endogenous_labels = all_labels.difference(exogenous_labels)
+    return matrix_df, matrix_df.to_numpy().astype(dtype)
 
-    # Calculate the new, reduced output for the exogenous (shocked) sectors
-    x_m_new = X_df.loc[exogenous_labels, 'GrossOutput'].copy()
-    for shock in shock_maps:
-        shock_label = (shock['region'], shock['sector'])
-        reduction_factor = 1.0 - shock['magnitude']
-        x_m_new.loc[shock_label] *= reduction_factor
+def _matrix_array(matrix_df, dtype=np.float64):
+    """
+    The values of matrix_df in the given precision: a view of the frame when it already
+    holds that dtype, otherwise the cached converted copy.
+    """
+    values = matrix_df.to_numpy()
+    if values.dtype == dtype:
+        return values
+    return _converted_matrix(matrix_df, dtype)[1]
+
+def _shock_labels(shock_maps):
+    """
+    (region, sector) labels of the shocked sectors, in shock_maps order. The MultiIndex
+    is built from one list per level, which skips the intermediate tuples.
+    """
+    return pd.MultiIndex.from_arrays([[shock['region'] for shock in shock_maps],
+                                      [shock['sector'] for shock in shock_maps]],
+                                     names=['region', 'sector'])
+
+def _partition_positions(all_labels, exogenous_labels):
+    """
+    Integer positions of the exogenous (shocked) sectors, in the order given, and of
+    the endogenous sectors, in matrix order. The matrices are then partitioned with
+    np.ix_ on these positions instead of .loc lookups through the MultiIndex.
+
+    Raises:
+        KeyError: If a shocked sector is not in all_labels.
+    """
+    exog_pos = label_positions(all_labels, exogenous_labels)
+    # One pass over a boolean mask, rather than the sort inside np.setdiff1d
+    endogenous = np.ones(len(all_labels), dtype=bool)
+    endogenous[exog_pos] = False
+    return exog_pos, np.flatnonzero(endogenous)
+
+@memoize(lambda all_labels, shock_maps: (id(all_labels), tuple((shock['region'], shock['sector']) for shock in shock_maps)),
+         maxsize=PARTITION_CACHE_SIZE)
+def _shock_partition(all_labels, shock_maps):
+    """
+    The positions of the shocked sectors, in shock_maps order, and of the others.
+    They depend only on which sectors are shocked, not by how much, so repeat runs
+    that only change the magnitudes skip the label lookups. all_labels is returned
+    first so the cache keeps it alive and its id stays unique.
+    """
+    exog_pos, endog_pos = _partition_positions(all_labels, _shock_labels(shock_maps))
+    return all_labels, exog_pos, endog_pos
 
-    # Partition the A matrix and Y vector
-    A_nm = A_df.loc[endogenous_labels, exogenous_labels]
-    A_mn = A_df.loc[exogenous_labels, endogenous_labels]
-    y_n = Y_df.loc[endogenous_labels, 'FinalDemand']
+def _shock_reductions(shock_maps):
+    """Output reduction factors (1 - magnitude) of the shocks, in shock_maps order."""
+    return np.fromiter((1.0 - shock['magnitude'] for shock in shock_maps), dtype=np.float64, count=len(shock_maps))
 
+def _gemv(alpha, a, x, beta, y, trans=False):
+    """
+    Computes y = alpha * op(a) @ x + beta * y in one BLAS gemv call, with op(a) = a.T
+    if trans, overwriting y when it already has the dtype of a. A C-ordered a is passed
+    as its Fortran-ordered transpose, so the wrapper never copies it.
+    """
+    gemv = scipy.linalg.get_blas_funcs('gemv', (a,))
+    if not a.flags.f_contiguous:
+        a, trans = a.T, not trans
+    return gemv(alpha, a, x, beta=beta, y=y, trans=trans, overwrite_y=True)
+
+def _load_mixed_model_kernel():
+    """
+    Imports the compiled mixed-model kernel on first use, so numba is only loaded
+    when needed. Returns None if numba is not installed or cannot set up the
+    kernel, in which case the caller falls back to NumPy.
+    """
+    try:
+        from src.mrio_kernels import mixed_model_output
+    except (ImportError, RuntimeError):
+        # numba raises RuntimeError when it cannot set up the kernel, e.g. without a cache locator
+        return None
+    return mixed_model_output
+
+def _mixed_model_output(L, A, y, endog_pos, exog_pos, delta_x_m):
+    """
+    The new output of the endogenous sectors in the Leontief mixed model,
+    (L_nn - L_nm L_mm^-1 L_mn)(y_n + A_mn' delta_x_m). L is only read through one
+    product with the full matrix, which needs no copy; the fancy-index copies are
+    limited to the blocks that touch the shocked sectors.
+    """
     # --- Core of the Mixed Model (Partitioning Method) ---
     # To avoid a costly matrix inversion at runtime, we use the pre-calculated
     # full Leontief inverse (L) to derive the inverse of the endogenous
     # sub-system (L_nn_inv) based on the method from Miller and Blair.
     # (I - A_nn)⁻¹ = L_nn - L_nm * (L_mm)⁻¹ * L_mn
-    L_nn = L_df.loc[endogenous_labels, endogenous_labels].to_numpy()
-    L_nm = L_df.loc[endogenous_labels, exogenous_labels].to_numpy()
-    L_mn = L_df.loc[exogenous_labels, endogenous_labels].to_numpy()
-    L_mm = L_df.loc[exogenous_labels, exogenous_labels].to_numpy()
+    # It is applied to the demand vector term by term, so the n x n inverse is never formed.
 
-    # This inversion is very fast as L_mm is small (its size is the number of shocked sectors)
-    L_mm_inv = np.linalg.inv(L_mm)
-    
-    # This is the Leontief inverse for the endogenous-only system, derived efficiently.
-    endogenous_leontief_inv = L_nn - (L_nm @ L_mm_inv @ L_mn)
+    # Calculate the new equilibrium output for endogenous sectors.
+    # We treat the reduction in available inputs as a negative final demand shock.
+    # This correctly propagates the supply constraint through the endogenous economy.
+    # v holds y_n + A_mn' delta_x_m at the endogenous positions and zero at the shocked ones.
+    # The product and the sum are one fused gemv into a copy of y.
+    v = _gemv(1.0, A[exog_pos], delta_x_m, 1.0, y.astype(A.dtype), trans=True)
+    v[exog_pos] = 0.0
+
+    # With v zero at the shocked positions, L @ v gives L_nn v and L_mn v in one product
+    Lv = L @ v.astype(L.dtype, copy=False)
+
+    # L_mm is small (its size is the number of shocked sectors), and solving against
+    # L_mn v is cheaper and better conditioned than inverting it explicitly.
+    L_mm = L[np.ix_(exog_pos, exog_pos)]
+    z = np.linalg.solve(L_mm, Lv[exog_pos])
+    return _gemv(-1.0, L[np.ix_(endog_pos, exog_pos)], z, 1.0, Lv[endog_pos])
+
+def _run_physical_risk_np(A_np, X_np, Y_np, L_np, endog_pos, exog_pos, reductions):
+    """
+    Numeric core of run_physical_risk on plain arrays sharing one sector order.
+    Callers that evaluate many scenarios on the same tables can convert them
+    once and call this directly.
+
+    Args:
+        A_np (np.ndarray): Technical coefficients matrix.
+        X_np (np.ndarray): Gross output vector.
+        Y_np (np.ndarray): Final demand vector.
+        L_np (np.ndarray): Leontief inverse, in the same precision as A_np.
+        endog_pos (np.ndarray): Positions of the endogenous (non-shocked) sectors.
+        exog_pos (np.ndarray): Positions of the exogenous (shocked) sectors.
+        reductions (np.ndarray): Remaining output fraction of each shocked sector, aligned with exog_pos.
+
+    Returns:
+        tuple: The change in final demand (Δy) and in gross output (Δx), both float64.
+    """
+    # Calculate the new, reduced output for the exogenous (shocked) sectors
+    # with one multiply by the reduction factors, aligned with exog_pos
+    x_old = np.asarray(X_np, dtype=np.float64)
+    x_m_old = x_old[exog_pos]
+    x_m_new = x_m_old * reductions
 
     # --- Corrected Calculation for New Endogenous Output ---
     # The standard mixed-model equation is x_n = (I - A_nn)⁻¹ * (A_nm * x_m_new + y_n).
     # However, this formula assumes the shock is on the *demand* side. For a supply-side
     # shock where inputs are constrained, we must adjust the final demand vector.
     # We calculate the change in inputs required by endogenous sectors from the shocked sectors.
-    x_m_old = X_df.loc[exogenous_labels, 'GrossOutput'].to_numpy()
-    delta_x_m = x_m_new.to_numpy() - x_m_old
-    unavailable_inputs = A_mn.to_numpy().T @ delta_x_m
-    
-    # Calculate the new equilibrium output for endogenous sectors.
-    # We treat the reduction in available inputs as a negative final demand shock.
-    # This correctly propagates the supply constraint through the endogenous economy.
-    x_n_new_values = endogenous_leontief_inv @ (y_n.to_numpy() + unavailable_inputs)
-    x_n_new = pd.Series(x_n_new_values, index=endogenous_labels)
-
-    # Combine new outputs and calculate the total change in production (Δx)
-    x_new = pd.concat([x_n_new, x_m_new])
-    x_new.name = 'GrossOutput'
-    # Reindex x_new to match the original order and structure of X_df.
-    # This is crucial to prevent alignment errors during subtraction.
-    x_new = x_new.reindex(X_df.index)
-    delta_x = x_new - X_df['GrossOutput']
-    
+    # x_m_new - x_m_old, folded into a single multiply
+    delta_x_m = x_m_old * (reductions - 1.0)
+    y = np.asarray(Y_np, dtype=np.float64)
+    mixed_model_kernel = _load_mixed_model_kernel() if len(y) <= MIXED_KERNEL_MAX_SIZE else None
+    if mixed_model_kernel is not None:
+        x_n_new_values = mixed_model_kernel(L_np, A_np, y, endog_pos, exog_pos, delta_x_m)
+    else:
+        x_n_new_values = _mixed_model_output(L_np, A_np, y, endog_pos, exog_pos, delta_x_m)
+
+    # Combine new outputs and calculate the total change in production (Δx).
+    # The new outputs are written by position into a copy of x, so the sector
+    # order is kept without a concat and a reindex on the labels.
+    x_new = x_old.copy()
+    x_new[endog_pos] = x_n_new_values
+    x_new[exog_pos] = x_m_new
+    delta_x = x_new - x_old
+
     # Calculate the resulting change in final demand (Δy)
-    # Efficiently calculate (I - A) without creating a large identity matrix
-    I_minus_A = -A_df.to_numpy()
-    I_minus_A[np.arange(len(all_labels)), np.arange(len(all_labels))] += 1
-    delta_y_req_values = I_minus_A @ delta_x.to_numpy()
-    delta_y_req = pd.Series(delta_y_req_values, index=all_labels)
+    # (I - A)Δx is computed as Δx - AΔx, so (I - A) is never formed. When few
+    # sectors changed, only the columns of A at the nonzero entries of Δx are read.
+    # Δx is cast to the precision of A so the product does not upcast A
+    delta_x_cast = delta_x.astype(A_np.dtype, copy=False)
+    support = np.flatnonzero(delta_x)
+    if support.size < SPARSE_DELTA_FRACTION * len(delta_x):
+        delta_y_req = delta_x - A_np[:, support] @ delta_x_cast[support]
+    else:
+        delta_y_req = delta_x - A_np @ delta_x_cast
 
     return delta_y_req, delta_x
 
-def run_physical_risk_ghosh(A_df, X_df, G_df, shock_maps):
+def run_physical_risk(A_df, X_df, Y_df, L_df, shock_maps, dtype=np.float64):
+    """
+    Models a physical risk scenario using a mixed input-output model.
+    This implementation uses the partitioning method with the pre-calculated
+    full Leontief inverse to ensure both accuracy and high performance.
+    A and L are read in the given dtype: np.float32 halves the memory traffic of
+    the matrix products at the cost of precision. Results are always float64.
+    """
+    # Matrices (A, X, Y, L) are passed as arguments to improve performance.
+    
+    # Identify exogenous (shocked) and endogenous (non-shocked) sectors.
+    # X, Y and L share the labels of A, so the positions apply to all of them
+    _, exog_pos, endog_pos = _shock_partition(A_df.index, shock_maps)
+
+    delta_y_req, delta_x = _run_physical_risk_np(
+        _matrix_array(A_df, dtype),
+        X_df['GrossOutput'].to_numpy(),
+        Y_df['FinalDemand'].to_numpy(),
+        _matrix_array(L_df, dtype),
+        endog_pos,
+        exog_pos,
+        _shock_reductions(shock_maps),
+    )
+
+    # The labels are attached only once the arrays are final
+    return pd.Series(delta_y_req, index=A_df.index), pd.Series(delta_x, index=X_df.index, name='GrossOutput')
+
+def run_physical_risk_ghosh(A_df, X_df, G_df, shock_maps, dtype=np.float64):
     """
     Models a physical risk scenario using the Ghosh supply-side model.
     This model is generally more suitable for simulating pure supply constraints.
+    G is read in the given dtype, as in run_physical_risk.
     """
     # 1. Identify Shocked vs. Non-Shocked Sectors
-    all_labels = A_df.index
-    exogenous_labels = pd.MultiIndex.from_tuples([
-        (shock['region'], shock['sector']) for shock in shock_maps
-    ], names=['region', 'sector'])
-    endogenous_labels = all_labels.difference(exogenous_labels)
+    _, exog_pos, endog_pos = _shock_partition(A_df.index, shock_maps)
 
     # 2. Calculate New Output for Shocked Sectors
-    x_m_new = X_df.loc[exogenous_labels, 'GrossOutput'].copy()
-    for shock in shock_maps:
-        shock_label = (shock['region'], shock['sector'])
-        reduction_factor = 1.0 - shock['magnitude']
-        x_m_new.loc[shock_label] *= reduction_factor
+    reductions = _shock_reductions(shock_maps)
+    x_old = X_df['GrossOutput'].to_numpy()
+    x_m_old = x_old[exog_pos]
+    x_m_new = x_m_old * reductions
 
     # 3. Partition the pre-computed Ghosh inverse matrix
-    # Partition the Ghosh inverse matrix
-    G_nn = G_df.loc[endogenous_labels, endogenous_labels].to_numpy()
-    G_mn = G_df.loc[exogenous_labels, endogenous_labels].to_numpy()
-    G_mm = G_df.loc[exogenous_labels, exogenous_labels].to_numpy()
-
-    G_mm_inv = np.linalg.inv(G_mm)
+    # Partition the Ghosh inverse matrix by position; G shares the labels of A
+    G = _matrix_array(G_df, dtype)
+    G_mn = G[np.ix_(exog_pos, endog_pos)]
+    G_mm = G[np.ix_(exog_pos, exog_pos)]
 
     # --- Corrected Ghosh Mixed-Model Calculation (Stable Formulation) ---
     # The previous formulation was unstable. The correct approach is to calculate the
     # change in output of the shocked sectors (delta_x_m) and propagate this change
     # forward through the supply chain using the appropriate part of the Ghosh inverse.
-    x_m_old = X_df.loc[exogenous_labels, 'GrossOutput'].to_numpy()
-    delta_x_m_row = (x_m_new.to_numpy() - x_m_old).T
+    delta_x_m_row = x_m_old * (reductions - 1.0)
     
-    # The change in output of the endogenous sectors is delta_x_n' = delta_x_m' * G_mm^-1 * G_mn
-    delta_x_n_values = (delta_x_m_row @ G_mm_inv @ G_mn)
-    x_n_new_values = X_df.loc[endogenous_labels, 'GrossOutput'].to_numpy() + delta_x_n_values
-    x_n_new = pd.Series(x_n_new_values, index=endogenous_labels)
-
-    # 4. Combine Results and Calculate Change
-    x_new = pd.concat([x_n_new, x_m_new]).reindex(X_df.index)
-    delta_x = x_new - X_df['GrossOutput']
+    # The change in output of the endogenous sectors is delta_x_n' = delta_x_m' * G_mm^-1 * G_mn,
+    # where delta_x_m' * G_mm^-1 is found by solving G_mm' z = delta_x_m instead of inverting G_mm
+    delta_x_n_values = np.linalg.solve(G_mm.T, delta_x_m_row) @ G_mn
+    x_n_new_values = x_old[endog_pos] + delta_x_n_values
+
+    # 4. Combine Results and Calculate Change, writing by position into a copy of X
+    x_new = x_old.copy()
+    x_new[endog_pos] = x_n_new_values
+    x_new[exog_pos] = x_m_new
+    delta_x = pd.Series(x_new - x_old, index=X_df.index)
     
     return None, delta_x # delta_y_req is not relevant for the Ghosh model
 
@@ -133,32 +267,47 @@ def run_transition_risk(shock_map):
     shock_label = (shock_map['region'], shock_map['sector'])
     land_set_aside_percent = shock_map['magnitude']
 
-    base_output_val = compute(X_df.loc[shock_label, 'GrossOutput'])
-    if hasattr(base_output_val, 'iloc'):
-        base_output = base_output_val.iloc[0]
-    else:
-        base_output = base_output_val
-    output_reduction = base_output * land_set_aside_percent
-    
-    delta_x_direct = pd.Series(0.0, index=A_df.index)
-    delta_x_direct[shock_label] = -output_reduction
-    npartitions = A_df.npartitions if hasattr(A_df, 'npartitions') else 1
-    delta_x_direct = dd.from_pandas(delta_x_direct, npartitions=npartitions)
-
-    A = A_df.to_dask_array(lengths=True)
-    I = da.eye(A.shape[0])
-    I_minus_A = I - A
-    
-    delta_y_req_values = I_minus_A @ delta_x_direct.to_dask_array(lengths=True)
-    delta_y_req = dd.from_dask_array(delta_y_req_values, index=A_df.index)
+    # X and A share their labels, so the position k of the shocked sector is looked up
+    # once and then used for X, Δx and the column of A
+    k = A_df.index.get_loc(shock_label)
+    output_reduction = X_df['GrossOutput'].to_numpy()[k] * land_set_aside_percent
+
+    delta_x_direct_values = np.zeros(len(A_df))
+    delta_x_direct_values[k] = -output_reduction
+
+    # delta_x_direct is nonzero only at the shocked sector k, so (I - A)Δx reduces to
+    # Δx - A[:, k]Δx_k: one column of A, without forming I - A
+    delta_y_req_values = A_df.to_numpy()[:, k] * output_reduction
+    delta_y_req_values[k] -= output_reduction
+    return pd.Series(delta_y_req_values, index=A_df.index), pd.Series(delta_x_direct_values, index=A_df.index)
 
-    return compute(delta_y_req), compute(delta_x_direct)
+def _home_linkages(matrix_df, shock_labels, home_label, shocks_as_rows):
+    """
+    Entries of matrix_df linking each shocked sector to the home sector, gathered by
+    integer position: matrix[shock, home] if shocks_as_rows, else matrix[home, shock].
+
+    Raises:
+        KeyError: If the home sector or a shocked sector is not in the matrix.
+    """
+    matrix = matrix_df.to_numpy()
+    if shocks_as_rows:
+        return matrix[label_positions(matrix_df.index, shock_labels), matrix_df.columns.get_loc(home_label)]
+    return matrix[matrix_df.index.get_loc(home_label), label_positions(matrix_df.columns, shock_labels)]
 
-def attribute_output_change(model_method, delta_x, shock_maps, home_region, home_sector, L_df=None, G_df=None, A_df=None):
+def _ranked_positions(values, top_k=None):
+    """
+    Positions of values from largest to smallest, with ties in their original order
+    as in sorted(..., reverse=True). With top_k, only the top_k largest are selected,
+    so the result is the first top_k entries of the full ranking.
+    """
+    return top_k_positions(values, len(values) if top_k is None else top_k)
+def attribute_output_change(model_method, delta_x, shock_maps, home_region, home_sector, L_df=None, G_df=None, A_df=None, top_k=None):
     """
     Attributes the change in a sector's gross output to the initial shock(s)
     using the appropriate inverse matrix (Leontief or Ghosh) to capture higher-order effects,
     or first-order effects for other models.
+    With top_k, only the top_k largest causes are returned, still as shares of
+    the total external impact.
     """
     home_label = (home_region, home_sector)
     # The total impact is the change in gross output for the home sector.
@@ -172,40 +321,43 @@ def attribute_output_change(model_method, delta_x, shock_maps, home_region, home
         }
     
     # Identify the initial shocks from the delta_x vector.
-    shock_labels = pd.MultiIndex.from_tuples([(s['region'], s['sector']) for s in shock_maps])
+    shock_labels = _shock_labels(shock_maps)
     initial_shocks = delta_x[delta_x.index.isin(shock_labels)].abs()
     
     # Use the appropriate matrix to calculate how much of each initial shock
     # contributes to the total production loss in the 'home' sector.
-    impact_causes = {}
+    # The matrix entries for all shocks are gathered by position in one step.
+    linkages = None
     if model_method == 'leontief' and L_df is not None:
         # Leontief: L_ij shows how much output from i is needed for 1 unit of final demand in j.
         # The contribution of a shock in sector i to sector j is L_ji * delta_x_i.
-        for shock_label, shock_value in initial_shocks.items():
-            contribution = L_df.loc[home_label, shock_label] * shock_value
-            impact_causes[f"{shock_label[0]} - {shock_label[1]}"] = contribution
+        linkages = _home_linkages(L_df, initial_shocks.index, home_label, shocks_as_rows=False)
     elif model_method == 'ghosh' and G_df is not None:
         # Ghosh: G_ij shows how much output from j is caused by 1 unit of primary input in i.
         # The contribution of a shock in sector i to sector j is G_ij * delta_x_i.
-        for shock_label, shock_value in initial_shocks.items():
-            contribution = G_df.loc[shock_label, home_label] * shock_value
-            impact_causes[f"{shock_label[0]} - {shock_label[1]}"] = contribution
+        linkages = _home_linkages(G_df, initial_shocks.index, home_label, shocks_as_rows=True)
     elif A_df is not None: # Fallback for Lenzen or other models (first-order impact)
         # A_ij shows direct input from i needed for 1 unit of output of j.
-        for shock_label, shock_value in initial_shocks.items():
-            contribution = A_df.loc[shock_label, home_label] * shock_value
-            impact_causes[f"{shock_label[0]} - {shock_label[1]}"] = contribution
-            
+        linkages = _home_linkages(A_df, initial_shocks.index, home_label, shocks_as_rows=True)
+
+    impact_causes = {}
+    if linkages is not None:
+        contributions = linkages * initial_shocks.to_numpy()
+        impact_causes = {f"{region} - {sector}": contribution
+                         for (region, sector), contribution in zip(initial_shocks.index, contributions)}
+
     # Exclude the home sector's contribution to its own impact from the attribution charts
     home_label_str = f"{home_region} - {home_sector}"
     external_causes = {k: v for k, v in impact_causes.items() if k != home_label_str}
 
     # Normalize the external causes to sum to 100%
     total_attributed_external = sum(external_causes.values())
+    labels = list(external_causes)
+    impacts = np.fromiter(external_causes.values(), dtype=np.float64, count=len(labels))
     attribution = {
         'total_impact': total_impact,
-        'causes': {label: (impact / total_attributed_external) * 100 if total_attributed_external > 0 else 0
-                   for label, impact in sorted(external_causes.items(), key=lambda item: item[1], reverse=True)},
+        'causes': {labels[i]: (impacts[i] / total_attributed_external) * 100 if total_attributed_external > 0 else 0
+                   for i in _ranked_positions(impacts, top_k)},
         'message': f'Change in Gross Output for {home_sector}'
     }
     
@@ -216,32 +368,13 @@ def attribute_portfolio_change(model_method, delta_x, shock_maps, portfolio_data
     Attributes the change in a portfolio's total value to the initial shock(s).
     It calculates the weighted contribution of each shock to each portfolio asset and sums them up.
     """
-    total_portfolio_impact = 0
-    portfolio_causes = {}
-
-    shock_labels = pd.MultiIndex.from_tuples([(s['region'], s['sector']) for s in shock_maps])
+    shock_labels = _shock_labels(shock_maps)
     initial_shocks = delta_x[delta_x.index.isin(shock_labels)].abs()
 
-    # Iterate through each asset in the portfolio
-    for asset in portfolio_data:
-        home_label = (asset['region'], asset['sector'])
-        asset_weight = asset['weight'] / 100.0
-        total_portfolio_impact += abs(delta_x.loc[home_label]) * asset_weight
-
-        # Calculate the contribution of each external shock to this specific asset
-        asset_impact_causes = {}
-        if model_method == 'leontief' and L_df is not None:
-            for shock_label, shock_value in initial_shocks.items():
-                contribution = L_df.loc[home_label, shock_label] * shock_value
-                asset_impact_causes[f"{shock_label[0]} - {shock_label[1]}"] = contribution
-        elif model_method == 'ghosh' and G_df is not None:
-            for shock_label, shock_value in initial_shocks.items():
-                contribution = G_df.loc[shock_label, home_label] * shock_value
-                asset_impact_causes[f"{shock_label[0]} - {shock_label[1]}"] = contribution
-        
-        # Add the weighted contributions to the overall portfolio causes
-        for cause, impact in asset_impact_causes.items():
-            portfolio_causes[cause] = portfolio_causes.get(cause, 0) + (impact * asset_weight)
+    # The asset weights are applied as one array rather than one multiply per asset and shock
+    home_labels = [(asset['region'], asset['sector']) for asset in portfolio_data]
+    asset_weights = np.fromiter((asset['weight'] / 100.0 for asset in portfolio_data), dtype=np.float64, count=len(portfolio_data))
+    total_portfolio_impact = np.abs(delta_x.loc[home_labels].to_numpy()) @ asset_weights
 
     if total_portfolio_impact < 1e-10:
         return {
@@ -250,6 +383,20 @@ def attribute_portfolio_change(model_method, delta_x, shock_maps, portfolio_data
             'causes': {}
         }
 
+    # Calculate the contribution of each external shock to each asset, as one row of
+    # linkages per asset, and add up the weighted contributions over the portfolio
+    portfolio_causes = {}
+    if model_method == 'leontief' and L_df is not None:
+        linkages = [_home_linkages(L_df, initial_shocks.index, home_label, shocks_as_rows=False) for home_label in home_labels]
+    elif model_method == 'ghosh' and G_df is not None:
+        linkages = [_home_linkages(G_df, initial_shocks.index, home_label, shocks_as_rows=True) for home_label in home_labels]
+    else:
+        linkages = None
+    if linkages is not None:
+        contributions = (asset_weights @ np.vstack(linkages)) * initial_shocks.to_numpy()
+        portfolio_causes = {f"{region} - {sector}": contribution
+                            for (region, sector), contribution in zip(initial_shocks.index, contributions)}
+
     # Normalize to 100%
     total_attributed = sum(portfolio_causes.values())
     attribution = {
@@ -259,11 +406,3 @@ def attribute_portfolio_change(model_method, delta_x, shock_maps, portfolio_data
         'message': 'Change in Total Portfolio Value'
     }
     return attribution
-
-def is_dask(data):
-    return isinstance(data, (dd.DataFrame, dd.Series, da.Array))
-
-def compute(data):
-    if isinstance(data, (dd.DataFrame, dd.Series, da.Array)):
-        return data.compute()
-    return data
\ No newline at end of file
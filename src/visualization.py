@@ -1,4 +1,5 @@
 
+import numpy as np
 import plotly.graph_objects as go
 
 def plot_waterfall_impact(attribution_df):
@@ -11,24 +12,31 @@ def plot_waterfall_impact(attribution_df):
     Returns:
         go.Figure: A Plotly waterfall chart figure.
     """
-    # The model calculates losses as negative values. For a waterfall, it's more intuitive
-    # to show these as positive contributions to the total loss.
-    plot_data = -attribution_df[attribution_df != 0]
+    values = attribution_df.to_numpy()
+    nonzero = values != 0
 
-    if plot_data.empty:
+    if not nonzero.any():
         return go.Figure().update_layout(
             title="No significant impact to display.",
             xaxis_visible=False,
             yaxis_visible=False
         )
 
+    # The model calculates losses as negative values. For a waterfall, it's more intuitive
+    # to show these as positive contributions to the total loss.
+    # Only the nonzero entries are selected and negated, so most of the series is never copied.
+    impacts = -values[nonzero]
+    measure = np.full(len(impacts) + 1, "relative", dtype=object)
+    measure[-1] = "total"
+
     fig = go.Figure(go.Waterfall(
         name="Impact Attribution",
         orientation="v",
-        measure=["relative"] * len(plot_data) + ["total"],
-        x=list(plot_data.index) + ["Total Impact"],
-        y=list(plot_data.values) + [plot_data.sum()],
-        text=[f"{v:,.2f}" for v in plot_data.values] + [f"{plot_data.sum():,.2f}"],
+        measure=measure,
+        x=np.append(attribution_df.index[nonzero].to_numpy(dtype=object), "Total Impact"),
+        y=np.append(impacts, np.nansum(impacts)),
+        # Bar labels are formatted by Plotly from y, rather than with one f-string per cause
+        texttemplate="%{y:,.2f}",
         textposition="outside",
         connector={"line": {"color": "rgb(63, 63, 63)"}},
     ))
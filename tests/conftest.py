@@ -1,6 +1,7 @@
 import pytest
 import pandas as pd
 import numpy as np
+import scipy.linalg
 import sys
 import os
 
@@ -42,7 +43,9 @@ def dummy_mrio_data():
     Z_matrix = A.to_numpy() * X['GrossOutput'].to_numpy()
     x_inv = 1 / X['GrossOutput'].to_numpy()
     B_matrix = (Z_matrix.T * x_inv).T
-    G_matrix = np.linalg.inv(I - B_matrix)
+    # Built from an LU factorization of (I - B), kept for tests that only need G applied to a vector
+    G_lu_piv = scipy.linalg.lu_factor(I - B_matrix)
+    G_matrix = scipy.linalg.lu_solve(G_lu_piv, I)
     G = pd.DataFrame(G_matrix, index=idx, columns=idx)
 
     # Mock country mapping
@@ -53,7 +56,11 @@ def dummy_mrio_data():
     }
 
     return {
-        "A": A, "X": X, "Y": Y, "L": L, "G": G,
+        "A": A, "X": X, "Y": Y, "L": L, "G": G, "G_lu_piv": G_lu_piv,
+        # Array views and a label -> position map, built once per session for
+        # tests that index by position rather than through the MultiIndex
+        "A_np": A.to_numpy(), "L_np": L.to_numpy(),
+        "idx_pos": {label: i for i, label in enumerate(idx)},
         "country_mapping": country_mapping,
         "COLOR_PALETTE": COLOR_PALETTE
     }
\ No newline at end of file
@@ -0,0 +1,103 @@
+import os
+import threading
+import pytest
+import numpy as np
+import pandas as pd
+from src import data_loader
+from src.data_loader import MRIOBundle, load_mrio_matrices, load_leontief_inverse
+
+YEAR = 2021
+
+@pytest.fixture
+def year_dir(tmp_path, monkeypatch):
+    """
+    Points the loaders at a temporary data directory holding the synthetic
+    dummy data for one year, with the Leontief inverse cache cleared around the test.
+    """
+    monkeypatch.setattr(data_loader, 'EXIOBASE_DIR', tmp_path / 'exiobase')
+    data_loader._generate_dummy_data(year=YEAR)
+    load_leontief_inverse.cache_clear()
+    yield tmp_path / 'exiobase' / str(YEAR)
+    load_leontief_inverse.cache_clear()
+
+def test_mrio_bundle_unpacks_in_requested_order(year_dir):
+    """Test that iterating over a bundle yields the matrices in the requested order."""
+    X, A, L = MRIOBundle(YEAR, matrices_to_load=['X', 'A', 'L'])
+
+    assert list(X.columns) == ['GrossOutput']
+    assert A.shape == (4, 4)
+    assert np.allclose(L.to_numpy(), pd.read_parquet(year_dir / 'EXIOBASE_L.parquet').to_numpy())
+    assert L.index.equals(A.index)
+
+def test_mrio_bundle_loads_each_matrix_once(year_dir, monkeypatch):
+    """
+    Test that each matrix is read from disk once, whether it is first accessed
+    as an attribute, from several threads, or by unpacking the bundle.
+    """
+    loaded = []
+    original_loader = data_loader.load_mrio_matrices
+
+    def counting_loader(year, matrices_to_load):
+        loaded.extend(matrices_to_load)
+        return original_loader(year, matrices_to_load=matrices_to_load)
+
+    monkeypatch.setattr(data_loader, 'load_mrio_matrices', counting_loader)
+    bundle = MRIOBundle(YEAR, matrices_to_load=['A', 'Y', 'L'])
+
+    threads = [threading.Thread(target=lambda: bundle.A) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert bundle.A is bundle.A
+
+    A, Y, L = bundle
+    assert A is bundle.A
+    assert sorted(loaded) == ['A', 'L', 'Y']
+
+    with pytest.raises(AttributeError):
+        bundle.G
+
+def test_load_mrio_matrices_reads_L_from_the_cache(year_dir):
+    """
+    Test that L is served from a memory-mapped .npy cache created on first use,
+    with the labels of A.
+    """
+    A, L = load_mrio_matrices(YEAR, matrices_to_load=['A', 'L'])
+
+    assert (year_dir / 'EXIOBASE_L.npy').exists()
+    assert not list(year_dir.glob('*.tmp'))
+    base = L.to_numpy()
+    while not isinstance(base, np.memmap) and isinstance(base.base, np.ndarray):
+        base = base.base
+    assert isinstance(base, np.memmap)
+    assert L.index.equals(A.index)
+    assert np.allclose(L.to_numpy(), pd.read_parquet(year_dir / 'EXIOBASE_L.parquet').to_numpy())
+
+    # A second load reuses the cache file instead of rewriting it
+    cache_mtime = (year_dir / 'EXIOBASE_L.npy').stat().st_mtime_ns
+    load_leontief_inverse.cache_clear()
+    load_leontief_inverse(YEAR)
+    assert (year_dir / 'EXIOBASE_L.npy').stat().st_mtime_ns == cache_mtime
+
+def test_load_mrio_matrices_with_no_matrices(year_dir):
+    """Test that an empty request returns no matrices instead of failing."""
+    assert load_mrio_matrices(YEAR, matrices_to_load=[]) == ()
+
+def test_leontief_cache_is_invalidated(year_dir):
+    """
+    Test that the L cache is rebuilt when EXIOBASE_L.parquet is newer, and removed
+    when the data for the year is regenerated.
+    """
+    L_path, cache_path = year_dir / 'EXIOBASE_L.parquet', year_dir / 'EXIOBASE_L.npy'
+    L_old = load_leontief_inverse(YEAR).to_numpy().copy()
+
+    # Rewrite L with new values and a modification time after the cache
+    pd.read_parquet(L_path).mul(2).to_parquet(L_path)
+    cache_mtime = cache_path.stat().st_mtime
+    os.utime(L_path, (cache_mtime + 10, cache_mtime + 10))
+    load_leontief_inverse.cache_clear()
+    assert np.allclose(load_leontief_inverse(YEAR).to_numpy(), 2 * L_old)
+
+    data_loader._generate_dummy_data(year=YEAR)
+    assert not cache_path.exists()
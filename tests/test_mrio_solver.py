@@ -0,0 +1,115 @@
+import sys
+import types
+import pytest
+import numpy as np
+import scipy.sparse
+from src.mrio_solver import calculate_leontief_inverse, factorize_leontief, solve_leontief, solve_many, neumann_solve, LeontiefOperator, _load_neumann_kernel
+
+def test_solve_leontief_matches_inverse(dummy_mrio_data):
+    """
+    Test that solving (I-A)x = Y with the LU factorization reproduces the
+    gross output obtained from the full Leontief inverse.
+    """
+    A, X, Y = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y']
+
+    x = solve_leontief(A, Y['FinalDemand'].to_numpy())
+    assert x == pytest.approx(X['GrossOutput'].to_numpy())
+
+    # A pre-computed factorization can be reused for several right-hand sides
+    lu_piv = factorize_leontief(A)
+    x_multi = solve_many(A, [Y['FinalDemand'].to_numpy(), 2 * Y['FinalDemand'].to_numpy()], lu_piv=lu_piv)
+    assert x_multi.shape == (len(A), 2)
+    assert x_multi[:, 1] == pytest.approx(2 * X['GrossOutput'].to_numpy())
+
+def test_calculate_leontief_inverse(dummy_mrio_data):
+    """Test that the Leontief inverse matches the pre-computed L matrix."""
+    A, L = dummy_mrio_data['A'], dummy_mrio_data['L']
+
+    L_calc = calculate_leontief_inverse(A)
+    assert L_calc.index.equals(A.index)
+    assert np.allclose(L_calc.to_numpy(), L.to_numpy())
+
+    L_single = calculate_leontief_inverse(A, dtype=np.float32)
+    assert L_single.to_numpy().dtype == np.float32
+    assert np.allclose(L_single.to_numpy(), L.to_numpy(), rtol=1e-5)
+
+    # The dtype also applies when the inverse is built from a factorization
+    L_factorized = calculate_leontief_inverse(A, lu_piv=factorize_leontief(A, dtype=np.float32), dtype=np.float32)
+    assert L_factorized.to_numpy().dtype == np.float32
+    assert np.allclose(L_factorized.to_numpy(), L.to_numpy(), rtol=1e-5)
+
+def test_sparse_leontief_matches_dense(dummy_mrio_data):
+    """Test that the sparse LU path gives the same results as the dense one."""
+    A, L, X, Y = dummy_mrio_data['A'], dummy_mrio_data['L'], dummy_mrio_data['X'], dummy_mrio_data['Y']
+    A_sparse = scipy.sparse.csr_matrix(A.to_numpy())
+
+    x = solve_leontief(A_sparse, Y['FinalDemand'].to_numpy())
+    assert x == pytest.approx(X['GrossOutput'].to_numpy())
+
+    L_sparse = calculate_leontief_inverse(A_sparse, index=A.index)
+    assert np.allclose(L_sparse.to_numpy(), L.to_numpy())
+
+    # A float32 factorization is also solved in float32
+    L_sparse_single = calculate_leontief_inverse(A_sparse, index=A.index, dtype=np.float32)
+    assert L_sparse_single.to_numpy().dtype == np.float32
+    assert np.allclose(L_sparse_single.to_numpy(), L.to_numpy(), rtol=1e-5)
+    x_single = solve_leontief(A, Y['FinalDemand'].to_numpy(), lu_piv=factorize_leontief(A, dtype=np.float32))
+    assert x_single.dtype == np.float32
+    assert np.allclose(x_single, X['GrossOutput'].to_numpy(), rtol=1e-5)
+
+def test_leontief_operator_refines_single_precision(dummy_mrio_data):
+    """
+    Test that a float32 factorization followed by iterative refinement
+    recovers the double precision gross output.
+    """
+    A, X, Y = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y']
+
+    operator = LeontiefOperator(A, dtype=np.float32)
+    x = operator.solve(Y['FinalDemand'].to_numpy())
+    assert x.dtype == np.float64
+    assert np.allclose(x, X['GrossOutput'].to_numpy(), rtol=1e-10)
+
+def test_neumann_solve(dummy_mrio_data):
+    """Test that the Neumann series converges to the gross output for a small A."""
+    A, X, Y = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y']
+
+    x = neumann_solve(A, Y['FinalDemand'].to_numpy())
+    assert x == pytest.approx(X['GrossOutput'].to_numpy(), rel=1e-7)
+
+    # Returns None when the series has not converged within maxiter terms
+    assert neumann_solve(A, Y['FinalDemand'].to_numpy(), maxiter=1) is None
+
+def test_neumann_solve_without_kernel(dummy_mrio_data, monkeypatch):
+    """
+    Test that neumann_solve falls back to NumPy when numba cannot set up the
+    kernel, as happens with cache=True in a build without a cache locator.
+    """
+    A, X, Y = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y']
+
+    def fail_setup(name):
+        raise RuntimeError("cannot cache function: no locator available")
+
+    broken_kernels = types.ModuleType('src.mrio_kernels')
+    broken_kernels.__getattr__ = fail_setup
+    monkeypatch.setitem(sys.modules, 'src.mrio_kernels', broken_kernels)
+
+    assert _load_neumann_kernel() is None
+    assert neumann_solve(A, Y['FinalDemand'].to_numpy()) == pytest.approx(X['GrossOutput'].to_numpy(), rel=1e-7)
+
+def test_solve_leontief_near_neumann_threshold():
+    """
+    Test that an A whose column-sum norm is just below the Neumann threshold is
+    solved exactly by default, and that method='neumann' falls back to LU when
+    the series cannot converge within its term limit.
+    """
+    size = 4
+    A = np.full((size, size), 0.94 / size)
+    y = np.arange(1.0, size + 1)
+    expected = np.linalg.solve(np.eye(size) - A, y)
+
+    x = solve_leontief(A, y)
+    assert np.allclose(x, expected, rtol=1e-12)
+    assert np.allclose(solve_leontief(A, y, method='neumann'), expected, rtol=1e-12)
+
+    with pytest.raises(ValueError):
+        solve_leontief(A, y, method='jacobi')
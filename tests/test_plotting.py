@@ -1,11 +1,20 @@
+import sys
+import types
 import pytest
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from dash import dash_table
 from src.plotting import (
     create_before_after_barchart,
     create_top_impacts_table,
-    create_sankey_diagram
+    create_sankey_diagram,
+    create_builder_historical_plot,
+    HISTORY_MAX_POINTS,
+    _load_sankey_kernel,
+    _sankey_links,
 )
+from src.indexing import top_k_positions
 from src.scenario_modeler import run_physical_risk
 
 def test_create_before_after_barchart(dummy_mrio_data):
@@ -18,13 +27,14 @@ def test_create_before_after_barchart(dummy_mrio_data):
     assert isinstance(fig, go.Figure)
 
 def test_create_top_impacts_table(dummy_mrio_data):
-    """Ensure the top impacts table function returns a Figure."""
+    """Ensure the top impacts table is a DataTable that excludes the shocked sectors."""
     X, A, Y, L = dummy_mrio_data['X'], dummy_mrio_data['A'], dummy_mrio_data['Y'], dummy_mrio_data['L']
     shock_maps = [{'region': 'C1', 'sector': 'Farming', 'magnitude': 0.1}]
     _, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
 
-    fig = create_top_impacts_table(delta_x, X, dummy_mrio_data['country_mapping'], dummy_mrio_data['COLOR_PALETTE'])
-    assert isinstance(fig, go.Figure)
+    table = create_top_impacts_table(delta_x, X, shock_maps, dummy_mrio_data['country_mapping'], dummy_mrio_data['COLOR_PALETTE'])
+    assert isinstance(table, dash_table.DataTable)
+    assert 0 < len(table.data) < len(X)
 
 def test_create_sankey_diagram(dummy_mrio_data):
     """Ensure the Sankey diagram function returns a Figure."""
@@ -33,4 +43,67 @@ def test_create_sankey_diagram(dummy_mrio_data):
     _, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
 
     fig = create_sankey_diagram(A, delta_x, shock_maps, 'C1', 'Food Processing', dummy_mrio_data['country_mapping'], dummy_mrio_data['COLOR_PALETTE'])
-    assert isinstance(fig, go.Figure)
\ No newline at end of file
+    assert isinstance(fig, go.Figure)
+
+def test_create_sankey_diagram_is_cached(dummy_mrio_data):
+    """Ensure repeat calls for the same scenario reuse the cached figure."""
+    X, A, Y, L = dummy_mrio_data['X'], dummy_mrio_data['A'], dummy_mrio_data['Y'], dummy_mrio_data['L']
+    shock_maps = [{'region': 'C1', 'sector': 'Farming', 'magnitude': 0.1}]
+    _, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
+
+    args = (A, delta_x, shock_maps, 'C1', 'Food Processing', dummy_mrio_data['country_mapping'], dummy_mrio_data['COLOR_PALETTE'])
+    assert create_sankey_diagram(*args) is create_sankey_diagram(*args)
+    assert create_sankey_diagram(A, delta_x * 2, *args[2:]) is not create_sankey_diagram(*args)
+
+    # Another year's A has the same shape, but must not be served this year's figure
+    A_other = A * 0.5
+    assert create_sankey_diagram(A_other, *args[1:]) is not create_sankey_diagram(*args)
+
+def test_create_sankey_diagram_missing_shock_label(dummy_mrio_data):
+    """Ensure a shocked sector missing from A raises instead of drawing another sector's flows."""
+    X, A, Y, L = dummy_mrio_data['X'], dummy_mrio_data['A'], dummy_mrio_data['Y'], dummy_mrio_data['L']
+    shock_maps = [{'region': 'C1', 'sector': 'Farming', 'magnitude': 0.1}]
+    _, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
+    missing_shock = [{'region': 'C9', 'sector': 'Farming', 'magnitude': 0.1}]
+
+    with pytest.raises(KeyError):
+        create_sankey_diagram(A, delta_x, missing_shock, 'C1', 'Food Processing', dummy_mrio_data['country_mapping'], dummy_mrio_data['COLOR_PALETTE'])
+
+def test_top_k_positions_breaks_ties_like_nlargest():
+    """Ensure ties at the k-th value select the same positions as Series.nlargest."""
+    values = np.array([1.0, 3.0, 2.0, 2.0, 3.0, 2.0, 0.0, 2.0])
+    for k in range(len(values) + 1):
+        expected = pd.Series(values).nlargest(k).index.to_numpy()
+        assert top_k_positions(values, k).tolist() == expected.tolist()
+
+def test_sankey_links_without_kernel(monkeypatch):
+    """Ensure the Sankey links fall back to NumPy when numba cannot set up the kernel."""
+    shock_to_inter = np.array([[0.5, 0.0], [0.0, 2.0]])
+    inter_to_target = np.array([1.0, 0.0])
+    shock_to_target = np.array([0.0, 3.0])
+    args = (shock_to_inter, inter_to_target, shock_to_target, [0, 1], [2, 3], 4)
+    expected = _sankey_links(*args)
+
+    def fail_setup(name):
+        raise RuntimeError("cannot cache function: no locator available")
+
+    broken_kernels = types.ModuleType('src.mrio_kernels')
+    broken_kernels.__getattr__ = fail_setup
+    monkeypatch.setitem(sys.modules, 'src.mrio_kernels', broken_kernels)
+
+    assert _load_sankey_kernel() is None
+    assert _sankey_links(*args) == expected
+
+def test_builder_historical_plot_downsamples_long_history(dummy_mrio_data):
+    """Ensure long histories are downsampled but keep their end points and peak."""
+    X = dummy_mrio_data['X']
+    values = np.sin(np.linspace(0, 20, 5000)) + 2
+    values[1234] = 10
+    history = pd.DataFrame([values], index=X.index[:1], columns=range(5000))
+    shocks = [{'region': X.index[0][0], 'sector': X.index[0][1], 'magnitude': 10}]
+
+    fig = create_builder_historical_plot(shocks, history, X, dummy_mrio_data['country_mapping'], dummy_mrio_data['COLOR_PALETTE'])
+    x, y = fig.data[0].x, fig.data[0].y
+    assert len(x) == HISTORY_MAX_POINTS
+    assert x[0] == 0 and x[-1] == 4999
+    assert y.max() == 10
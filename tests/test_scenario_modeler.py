@@ -1,6 +1,9 @@
 import pytest
+import numpy as np
 import pandas as pd
-from src.scenario_modeler import run_physical_risk, run_physical_risk_ghosh, attribute_output_change
+import scipy.linalg
+from src import scenario_modeler
+from src.scenario_modeler import run_physical_risk, run_transition_risk, run_physical_risk_ghosh, attribute_output_change, _mixed_model_output, _ranked_positions, _run_physical_risk_np
 
 def test_leontief_model_shock(dummy_mrio_data):
     """
@@ -22,39 +25,167 @@ def test_leontief_model_shock(dummy_mrio_data):
     # Assert the dependent sector (C1-Food Processing) is also impacted negatively
     assert delta_x.loc[('C1', 'Food Processing')] < 0
 
+    # Single precision matrices give the same result to within float32 accuracy
+    _, delta_x_single = run_physical_risk(A, X, Y, L, shock_maps, dtype=np.float32)
+    assert delta_x_single.dtype == np.float64
+    assert delta_x_single.to_numpy() == pytest.approx(delta_x.to_numpy(), rel=1e-4)
+
+def test_mixed_model_output_matches_partitioned_inverse(dummy_mrio_data):
+    """
+    Test that applying the mixed model to the demand vector term by term gives the
+    same endogenous output as the explicit partitioned inverse L_nn - L_nm L_mm^-1 L_mn.
+    """
+    A, Y, L = dummy_mrio_data['A_np'], dummy_mrio_data['Y'], dummy_mrio_data['L_np']
+    y = Y['FinalDemand'].to_numpy(dtype=float)
+    endog_pos, exog_pos = np.array([1, 3]), np.array([0, 2])
+    delta_x_m = np.array([-10.0, -5.0])
+
+    L_nn, L_nm = L[np.ix_(endog_pos, endog_pos)], L[np.ix_(endog_pos, exog_pos)]
+    L_mn, L_mm = L[np.ix_(exog_pos, endog_pos)], L[np.ix_(exog_pos, exog_pos)]
+    endogenous_inverse = L_nn - L_nm @ np.linalg.inv(L_mm) @ L_mn
+    expected = endogenous_inverse @ (y[endog_pos] + A[np.ix_(exog_pos, endog_pos)].T @ delta_x_m)
+
+    assert _mixed_model_output(L, A, y, endog_pos, exog_pos, delta_x_m) == pytest.approx(expected)
+
+def test_mixed_model_kernel_matches_numpy(dummy_mrio_data):
+    """
+    Test that the compiled mixed-model kernel gives the same endogenous output
+    as the NumPy version, in double and single precision.
+    """
+    mrio_kernels = pytest.importorskip("src.mrio_kernels")
+    A, Y, L = dummy_mrio_data['A_np'], dummy_mrio_data['Y'], dummy_mrio_data['L_np']
+    positions = (np.array([1, 3]), np.array([0, 2]), np.array([-10.0, -5.0]))
+    y = Y['FinalDemand'].to_numpy(dtype=float)
+
+    assert mrio_kernels.mixed_model_output(L, A, y, *positions) == pytest.approx(_mixed_model_output(L, A, y, *positions))
+
+    L_single, A_single = L.astype(np.float32), A.astype(np.float32)
+    assert mrio_kernels.mixed_model_output(L_single, A_single, y, *positions) == pytest.approx(
+        _mixed_model_output(L_single, A_single, y, *positions), rel=1e-5)
+
+def test_run_physical_risk_np_matches_wrapper(dummy_mrio_data):
+    """
+    Test that the array core gives the same results as run_physical_risk when
+    the positions and reductions are supplied directly.
+    """
+    A, X, Y, L = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y'], dummy_mrio_data['L']
+    idx_pos = dummy_mrio_data['idx_pos']
+    shock_maps = [{'region': 'C1', 'sector': 'Farming', 'magnitude': 0.5}]
+
+    delta_y, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
+
+    exog_pos = np.array([idx_pos[('C1', 'Farming')]])
+    endog_pos = np.setdiff1d(np.arange(len(A)), exog_pos)
+    delta_y_np, delta_x_np = _run_physical_risk_np(
+        dummy_mrio_data['A_np'], X['GrossOutput'].to_numpy(), Y['FinalDemand'].to_numpy(),
+        dummy_mrio_data['L_np'], endog_pos, exog_pos, np.array([0.5]),
+    )
+    assert delta_x_np == pytest.approx(delta_x.to_numpy())
+    assert delta_y_np == pytest.approx(delta_y.to_numpy())
+
+def test_transition_risk_matches_explicit_inverse(dummy_mrio_data, monkeypatch):
+    """
+    Test that the single-column transition risk update gives the same final demand
+    change as the explicit (I - A) product, and that the Leontief inverse maps it
+    back to the direct output change.
+    """
+    A, X = dummy_mrio_data['A'], dummy_mrio_data['X']
+    E = pd.DataFrame({'LandUse': 0.1}, index=A.index)
+    monkeypatch.setattr(scenario_modeler, 'load_mrio_matrices', lambda matrices_to_load: (A, E, X))
+
+    delta_y, delta_x = run_transition_risk({'region': 'C1', 'sector': 'Farming', 'magnitude': 0.25})
+
+    expected_delta_x = np.zeros(len(A))
+    expected_delta_x[dummy_mrio_data['idx_pos'][('C1', 'Farming')]] = -0.25 * X.loc[('C1', 'Farming'), 'GrossOutput']
+    assert delta_x.to_numpy() == pytest.approx(expected_delta_x)
+    assert delta_y.index.equals(A.index)
+    assert delta_y.to_numpy() == pytest.approx((np.eye(len(A)) - dummy_mrio_data['A_np']) @ expected_delta_x)
+    assert dummy_mrio_data['L_np'] @ delta_y.to_numpy() == pytest.approx(expected_delta_x)
+
 def test_ghosh_model_shock(dummy_mrio_data):
     """
     Test that a Ghosh model shock correctly reduces output in the shocked
     sector and propagates to dependent sectors.
     """
     A, X, G = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['G']
+    idx_pos = dummy_mrio_data['idx_pos']
     
     # Shock C2-Mining by 100%
     shock_maps = [{'region': 'C2', 'sector': 'Mining', 'magnitude': 1.0}]
     
     _, delta_x = run_physical_risk_ghosh(A, X, G, shock_maps)
+    delta_x_values, x_values = delta_x.to_numpy(), X['GrossOutput'].to_numpy()
 
     # Assert the shocked sector's output is reduced to zero
-    original_output = X.loc[('C2', 'Mining'), 'GrossOutput']
-    assert delta_x.loc[('C2', 'Mining')] == pytest.approx(-original_output)
+    mining = idx_pos[('C2', 'Mining')]
+    assert delta_x_values[mining] == pytest.approx(-x_values[mining])
 
     # Assert the dependent sector (C2-Manufacturing) is also impacted negatively
-    assert delta_x.loc[('C2', 'Manufacturing')] < 0
+    assert delta_x_values[idx_pos[('C2', 'Manufacturing')]] < 0
+
+    # A single shock changes the primary input of Mining only, so delta_x is a multiple of
+    # the Mining row of G, i.e. of the solution of (I - B)' g = e_mining
+    e_mining = np.zeros(len(x_values))
+    e_mining[mining] = 1.0
+    mining_row = scipy.linalg.lu_solve(dummy_mrio_data['G_lu_piv'], e_mining, trans=1)
+    assert delta_x_values == pytest.approx(mining_row * (-x_values[mining] / mining_row[mining]))
 
 def test_attribute_output_change(dummy_mrio_data):
     """
     Test the attribution function to ensure it returns a valid structure.
     """
     A, X, Y, L = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y'], dummy_mrio_data['L']
-    shock_maps = [{'region': 'C1', 'sector': 'Farming', 'magnitude': 0.1}]
+    # A shock to Food Processing reaches Farming, its supplier, through L[Farming, Food Processing]
+    shock_maps = [{'region': 'C1', 'sector': 'Food Processing', 'magnitude': 0.1}]
     _, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
 
-    attribution = attribute_output_change(L, delta_x, 'C1', 'Food Processing')
+    attribution = attribute_output_change('leontief', delta_x, shock_maps, 'C1', 'Farming', L_df=L)
 
     assert isinstance(attribution, dict)
     assert 'causes' in attribution
     assert 'total_impact' in attribution
     
-    # The only external cause should be C1-Farming
-    assert 'C1 - Farming' in attribution['causes']
-    assert pytest.approx(sum(attribution['causes'].values()), 1) == 100.0
\ No newline at end of file
+    # The only external cause should be C1-Food Processing
+    assert 'C1 - Food Processing' in attribution['causes']
+    assert pytest.approx(sum(attribution['causes'].values()), 1) == 100.0
+
+def test_attribute_output_change_top_k(dummy_mrio_data):
+    """
+    Test that top_k keeps only the largest causes, with the same shares as the
+    full attribution.
+    """
+    A, X, Y, L = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y'], dummy_mrio_data['L']
+    shock_maps = [{'region': 'C1', 'sector': 'Farming', 'magnitude': 0.1},
+                  {'region': 'C2', 'sector': 'Mining', 'magnitude': 0.2}]
+    _, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
+
+    full = attribute_output_change('leontief', delta_x, shock_maps, 'C2', 'Manufacturing', L_df=L)
+    top = attribute_output_change('leontief', delta_x, shock_maps, 'C2', 'Manufacturing', L_df=L, top_k=1)
+
+    assert len(full['causes']) == 2
+    first_label, first_share = next(iter(full['causes'].items()))
+    assert top['causes'] == {first_label: pytest.approx(first_share)}
+
+def test_ranked_positions_top_k_keeps_tied_order():
+    """
+    Test that a truncated ranking is the leading part of the full one when values
+    are tied at the cut-off, as with sorted(..., reverse=True).
+    """
+    values = np.array([2.0, 5.0, 2.0, 1.0, 5.0, 2.0, 2.0, 0.0])
+    full = _ranked_positions(values)
+    assert full.tolist() == sorted(range(len(values)), key=lambda i: values[i], reverse=True)
+    for top_k in range(len(values) + 1):
+        assert _ranked_positions(values, top_k).tolist() == full[:top_k].tolist()
+
+def test_attribute_output_change_missing_shock_label(dummy_mrio_data):
+    """
+    Test that a shocked sector missing from the inverse matrix raises KeyError
+    rather than reading another sector's linkage.
+    """
+    A, X, Y, L = dummy_mrio_data['A'], dummy_mrio_data['X'], dummy_mrio_data['Y'], dummy_mrio_data['L']
+    shock_maps = [{'region': 'C1', 'sector': 'Farming', 'magnitude': 0.1}]
+    _, delta_x = run_physical_risk(A, X, Y, L, shock_maps)
+    L_missing = L.drop(index=[('C1', 'Farming')], columns=[('C1', 'Farming')])
+
+    with pytest.raises(KeyError):
+        attribute_output_change('leontief', delta_x, shock_maps, 'C2', 'Manufacturing', L_df=L_missing)